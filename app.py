@@ -1,10 +1,18 @@
 from flask import Flask, request, jsonify, render_template
-import subprocess
-import torch
 from sentence_transformers import SentenceTransformer
 from flask_cors import CORS
-import re
 import os
+from collections import OrderedDict
+
+from canonicalize import ResultCache, canonicalize
+from cascade import Cascade
+from command_index import (CommandIndex, build_fast_path, fast_path_suggestion, load_fast_path, replay_feedback,
+                           shard_of, shard_suffix, to_suggestions)
+from entities import entities
+from executor import ExecutorPool, QueueFull
+from feedback import FeedbackLog, start_compactor
+from overlays import TENANT_HEADER, OverlayRegistry, merge_suggestions
+from shard_router import merge_rows
 
 
 app = Flask(__name__)
@@ -15,56 +23,173 @@ def extract_dynamic_values(query):
     Extracts potential filenames or folder names from the user query.
     Returns a list of strings.
     """
-    filenames = re.findall(FILENAME_PATTERN, query)
-    dirs = re.findall(DIR_PATTERN, query)
-    return filenames + dirs
+    return [e.value for e in entities(query, ("filename", "path"))]
+
 
+# ----------------------------
+# 0. Start the /run execution workers: separate interpreters running executor.py
+#    (standard library only), exec'd fresh so they share nothing with this process
+# ----------------------------
+executor = ExecutorPool(workers=4, max_queue=32, timeout=5)
 
 # ----------------------------
 # 1. Load saved Sentence-BERT model
 # ----------------------------
-model = SentenceTransformer("saved_model_2")
+MODEL_NAME = "saved_model_2"
+model = SentenceTransformer(MODEL_NAME)
 
 # ----------------------------
 # 2. Load precomputed embeddings and command list
 # ----------------------------
-query_embeddings = torch.load("query_embeddings_2.pt")   # tensor of shape [num_commands, embedding_dim]
-commands_list = torch.load("commands_list_2.pt")         # list of cmd + description strings in same order
+# Sharded serving (see shard_router.py): TEXT2CMD_SHARD=i/n loads only partition i of n,
+# as written by: python build_index.py --shards n
+SHARD = os.environ.get("TEXT2CMD_SHARD")
+SUFFIX = "_2"
+if SHARD:
+    SHARD_ID, SHARDS = map(int, SHARD.split("/"))
+    SUFFIX = shard_suffix(SUFFIX, SHARD_ID, SHARDS)
+search_index = CommandIndex.load(f"query_embeddings{SUFFIX}.pt", f"commands_list{SUFFIX}.pt",
+                                 f"queries_list{SUFFIX}.pt", "commands_list_2.pt" if SHARD else None)
+
+# Coarse-to-fine search: TEXT2CMD_CENTROIDS=<n> scores command centroids first and
+# rescores only the paraphrases of the best n commands (see centroid_index.py)
+CENTROID_CANDIDATES = int(os.environ.get("TEXT2CMD_CENTROIDS", 0))
+if CENTROID_CANDIDATES:
+    search_index.use_centroids(CENTROID_CANDIDATES, f"command_centroids{SUFFIX}.pt")
+
+# ----------------------------
+# 2b. Feedback: accepted suggestions form a delta segment searched with the base index
+# ----------------------------
+COMPACT_INTERVAL = 600        # seconds between folds of the delta into the .pt files
+RECENT_QUERIES = 256          # how many /suggest embeddings to keep for /run to reuse
+
+feedback_log = FeedbackLog()
+recent_query_embs = OrderedDict()
+# Shards are read-only: /run on a shard captures no feedback. New pairs reach them
+# by adding rows to commands.csv and rebuilding with build_index.py --shards n.
+if not SHARD:
+    replay_feedback(search_index, feedback_log, model, MODEL_NAME)
+
+# Exact / typo-tolerant paraphrase hits skip the encoder entirely. A shard looks up
+# every paraphrase (the strings are small), so a text that is ambiguous across
+# shards falls through to dense search everywhere, as it does unsharded
+fast_path = load_fast_path() if SHARD else build_fast_path(search_index)
+
+# Dense results keyed by entity-masked query text: "copy a.txt to /x" and
+# "copy b.txt to /y" share one entry; values are re-injected per request.
+# Entries are (rows, query embedding), so overlay search and /run reuse the encoding
+result_cache = ResultCache()
+
+
+def remember_query(query, query_emb):
+    recent_query_embs[query] = query_emb
+    recent_query_embs.move_to_end(query)
+    while len(recent_query_embs) > RECENT_QUERIES:
+        recent_query_embs.popitem(last=False)
+
+
+def record_feedback(query, cmd):
+    """Log an accepted (query, command) pair and make it searchable immediately."""
+    if search_index.contains(query, cmd):
+        return
+    query_emb = recent_query_embs.pop(query, None)
+    if query_emb is None:
+        query_emb = model.encode(canonicalize(query).text, convert_to_tensor=True)
+    offset = feedback_log.append(query, cmd)
+    search_index.delta.add(query, cmd, query_emb, offset)
+    if cascade is not None:
+        cascade.add_feedback(query, cmd, offset)
+    result_cache.clear()   # cached rankings predate the new row
+    if fast_path is not None:
+        fast_path.add(query, cmd)
+
+
+# ----------------------------
+# 2c. Tenant overlay packs (see overlays.py). The tenant comes from the server-side
+#     token file, so a client cannot pick another tenant's packs or /run allowlist
+# ----------------------------
+overlays = OverlayRegistry(MODEL_NAME)
+
+
+def request_tenant():
+    return overlays.tenant(request.headers.get(TENANT_HEADER))
+
+# ----------------------------
+# 2d. Optional small-model-first cascade (build with: python build_index.py --cascade)
+# ----------------------------
+# Thresholds from `python cascade.py --report`: TEXT2CMD_CASCADE_MARGIN / TEXT2CMD_CASCADE_MIN_SCORE
+cascade = None
+if os.environ.get("TEXT2CMD_CASCADE") == "1":
+    cascade = Cascade.load(model, search_index, None if SHARD else feedback_log)
+
+if not SHARD:
+    start_compactor(COMPACT_INTERVAL, lambda: (cascade or search_index).compact(feedback_log))
 
 # ----------------------------
 # 3. Suggest commands
 # ----------------------------
+def dense_rows(query, k, distinct=False):
+    """
+    (rows, query embedding): encode the entity-masked query for semantic search,
+    unless an equivalent one was just answered.
+    """
+    text = canonicalize(query).text
+    key = f"{k}:{distinct}:{text}"
+    cached = result_cache.get(key)
+    if cached is None:
+        query_emb = model.encode(text, convert_to_tensor=True)
+        cached = (search_index.search(query_emb, k=k, distinct=distinct), query_emb)
+        result_cache.put(key, cached)
+    remember_query(query, cached[1])
+    return cached
+
+
+def dense_suggestions(query, k, distinct=False):
+    """Base index suggestions, merged with the requesting tenant's overlay packs."""
+    tenant = request_tenant()
+    rows, query_emb = dense_rows(query, k, distinct)
+    suggestions = to_suggestions(query, rows, search_index)
+    if not overlays.packs(tenant):
+        return suggestions
+    return merge_suggestions(suggestions, overlays.search(tenant, query, query_emb, k), k)
 
-# Regex to detect filenames with common extensions
-FILENAME_PATTERN = r'\b[\w\-. ]+\.(txt|sh|log|conf|bin|csv|gz|img|exe)\b'
 
 @app.route('/suggest', methods=['POST'])
 def suggest():
     query = request.json.get('query', '')
+    tenant = request_tenant()
 
-    # Extract file names from query
-    filenames = re.findall(FILENAME_PATTERN, query)
+    hit = overlays.lookup(tenant, query)
+    if hit is None and fast_path is not None:
+        hit = fast_path.lookup(query)
+    if hit is not None:
+        return jsonify(fast_path_suggestion(query, hit))
 
-    # Encode query for semantic search
-    query_emb = model.encode(query, convert_to_tensor=True)
-    scores = torch.nn.functional.cosine_similarity(query_emb.unsqueeze(0), query_embeddings)
-    topk = torch.topk(scores, k=3)
+    # Overlay packs are encoded with the large model, so tenants with packs skip the cascade
+    if cascade is not None and not overlays.packs(tenant):
+        suggestions, stage, query_emb = cascade.suggest(query, k=3)
+        if stage == "large":
+            remember_query(query, query_emb)
+        return jsonify([dict(s, model=stage) for s in suggestions])
 
-    suggestions = []
+    return jsonify(dense_suggestions(query, 3))
 
-    for score, idx in zip(topk[0], topk[1]):
-        cmd = commands_list[idx]
 
-        # Replace common hardcoded filenames in the command with user-provided file
-        if filenames:
-            file_name = filenames[0]  # take first detected file
-            for placeholder in ['file.txt', 'config.conf', 'script.sh', 'error.log', 'access.log']:
-                if placeholder in cmd:
-                    cmd = cmd.replace(placeholder, file_name)
+@app.route('/search', methods=['POST'])
+def search_shard():
+    """This node's top-k, one suggestion per command, for shard_router.py to merge."""
+    query = request.json.get('query', '')
+    k = int(request.json.get('k', 3))
 
-        suggestions.append({"command": cmd, "score": float(score)})
+    hit = overlays.lookup(request_tenant(), query)
+    if hit is None and fast_path is not None:
+        hit = fast_path.lookup(query)
+        if hit is not None and SHARD and shard_of(hit.command, SHARDS) != SHARD_ID:
+            return jsonify([])   # the shard holding the command answers it
+    if hit is not None:
+        return jsonify(fast_path_suggestion(query, hit))
 
-    return jsonify(suggestions)
+    return jsonify(merge_rows([dense_suggestions(query, k, distinct=True)], k))
 
 # ----------------------------
 # 4. Execute command safely
@@ -72,17 +197,44 @@ def suggest():
 @app.route('/run', methods=['POST'])
 def run_command():
     cmd = request.json.get('command', '')
+    query = request.json.get('query', '')   # set when the command was picked from suggestions
 
-    # Safety: only allow commands in your dataset
-    allowed_cmds = [c.split(" : ")[0] for c in commands_list]
-    if cmd not in allowed_cmds:
+    # Safety: only allow commands in your dataset (or in the tenant's overlay packs)
+    in_base = cmd in search_index.allowed_commands()
+    if not in_base and not overlays.allows(request_tenant(), cmd):
         return jsonify({"error": "Command not allowed"}), 403
 
+    # Tenant commands never enter the shared feedback delta
+    if query and in_base and not SHARD:
+        record_feedback(query, cmd)
+
+    try:
+        return jsonify(executor.submit(cmd))
+    except QueueFull:
+        return jsonify({"error": "Too many commands running, try again shortly"}), 503, {"Retry-After": "1"}
+
+
+@app.route('/metrics')
+def metrics():
+    out = {"executor": executor.metrics(), "result_cache": result_cache.stats(), "overlays": overlays.stats()}
+    if cascade is not None:
+        out["cascade"] = cascade.stats()
+    return jsonify(out)
+
+# ----------------------------
+# 4b. Load / unload overlay packs at runtime (local requests only)
+# ----------------------------
+@app.route('/overlays/<tenant>/<name>', methods=['POST', 'DELETE'])
+def manage_overlay(tenant, name):
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Overlay management is local only"}), 403
+    if request.method == 'DELETE':
+        return jsonify({"unloaded": overlays.unload(tenant, name)})
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
-        return jsonify({"stdout": result.stdout, "stderr": result.stderr})
-    except Exception as e:
-        return jsonify({"error": str(e)})
+        pack = overlays.load(tenant, name)
+    except (OSError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"loaded": f"{tenant}/{name}", "rows": len(pack.commands)})
 
 # ----------------------------
 # 5. Serve frontend
@@ -93,4 +245,4 @@ def index():
 
 # ----------------------------
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=not SHARD, port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+batch_translate.py
+
+Bulk offline translation of natural-language requests (one per line) into
+suggested commands, e.g. for help-desk logs.
+
+Queries are streamed from a file or stdin in chunks, each chunk is encoded in
+large batches and scored against the index in row blocks inside a process pool,
+and results are written as JSONL in input order. Only a bounded number of
+chunks is in flight at once, so memory does not grow with the input size.
+Every command has about a dozen paraphrase rows, so each query gets the best
+row of k distinct commands: rows are over-fetched and deduped, and the few
+queries still short of k are searched again with a wider fetch.
+
+Usage:
+  python batch_translate.py queries.txt -o results.jsonl
+  cat requests.log | python batch_translate.py - -o results.jsonl --workers 4
+  python batch_translate.py big.log -o results.jsonl --resume     # continue a partial run
+
+Output line: {"line": 0, "query": "...", "suggestions": [{"command": "...", "score": 0.83}, ...]}
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import multiprocessing as mp
+
+
+# ----------------------------
+# 1. Worker side: model + index loaded once per process
+# ----------------------------
+_model = None
+_index = None
+DISTINCT_FETCH = 8   # rows fetched per suggestion before deduping to distinct commands
+
+
+def _init_worker(model_name: str, embeddings_path: str, commands_path: str, threads: int):
+    global _model, _index
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from command_index import CommandIndex
+
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name)
+    _index = CommandIndex.load(embeddings_path, commands_path)
+
+
+def _translate_chunk(start: int, queries: list, k: int, batch_size: int, block_rows: int) -> str:
+    """Encode and score one chunk; returns the JSONL text for it."""
+    from canonicalize import canonicalize, fill_command
+
+    embs = _model.encode([canonicalize(q).text for q in queries], batch_size=batch_size, convert_to_tensor=True)
+    out = []
+    for i, (q, hits) in enumerate(zip(queries, _distinct_rows(embs, k, block_rows))):
+        suggestions = [{"command": fill_command(_index.commands[r], q, _index.paraphrase(r)), "score": s}
+                       for s, r in hits]
+        out.append(json.dumps({"line": start + i, "query": q, "suggestions": suggestions}))
+    return "\n".join(out) + "\n"
+
+
+def _distinct_rows(embs, k: int, block_rows: int) -> list:
+    """Per query, (score, row) of the best row of each of the top k distinct commands."""
+    import torch
+
+    results = [None] * len(embs)
+    todo, fetch = list(range(len(embs))), k * DISTINCT_FETCH
+    while todo:
+        scores, rows = _index.search_batch(embs[torch.tensor(todo)], k=fetch, block_rows=block_rows)
+        short = []
+        for i, row_scores, row_ids in zip(todo, scores.tolist(), rows.tolist()):
+            best = {}
+            for s, r in zip(row_scores, row_ids):
+                best.setdefault(_index.commands[r], (s, r))
+            results[i] = list(best.values())[:k]
+            if len(best) < k and fetch < len(_index.commands):
+                short.append(i)
+        todo, fetch = short, fetch * 4
+    return results
+
+
+# ----------------------------
+# 2. Driver side: streaming, ordering, resume
+# ----------------------------
+def completed_lines(output_path: str) -> int:
+    """Count complete JSONL records and drop a trailing partial line left by a crash."""
+    if not os.path.exists(output_path):
+        return 0
+    done, good_end = 0, 0
+    with open(output_path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            done += 1
+            good_end += len(raw)
+    with open(output_path, "r+b") as f:
+        f.truncate(good_end)
+    return done
+
+
+def read_chunks(stream, chunk_size: int, skip: int):
+    lines = (line.rstrip("\r\n") for line in stream)
+    lines = itertools.islice(lines, skip, None)
+    start = skip
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def run(args):
+    skip = completed_lines(args.output) if args.resume else 0
+    if skip:
+        print(f"[batch] resuming after {skip} completed lines", file=sys.stderr)
+
+    workers = args.workers or max(1, (os.cpu_count() or 2) // 2)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    in_flight = deque()
+    done, t0 = skip, time.time()
+
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with stream, open(args.output, "a" if args.resume else "w", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                initializer=_init_worker,
+                                initargs=(args.model, args.embeddings, args.commands, threads)) as pool:
+
+        def drain(limit):
+            nonlocal done
+            while len(in_flight) > limit:
+                n, fut = in_flight.popleft()
+                out.write(fut.result())   # head of the queue: keeps input order
+                out.flush()
+                done += n
+                rate = (done - skip) / max(time.time() - t0, 1e-9)
+                print(f"\r[batch] {done} lines ({rate:.0f}/s)", end="", file=sys.stderr)
+
+        for start, chunk in read_chunks(stream, args.chunk_size, skip):
+            in_flight.append((len(chunk), pool.submit(_translate_chunk, start, chunk, args.k,
+                                                      args.batch_size, args.block_rows)))
+            drain(args.max_in_flight or 2 * workers)
+        drain(0)
+    print(f"\n[batch] wrote {done} lines to {args.output}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a file of queries to commands (JSONL output)")
+    parser.add_argument("input", help="Query file, one per line, or - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output path")
+    parser.add_argument("-k", type=int, default=3, help="Suggestions per query")
+    parser.add_argument("--resume", action="store_true", help="Skip lines already written to --output")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: half the CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="Queries per unit of work")
+    parser.add_argument("--batch-size", type=int, default=256, help="Encoder batch size")
+    parser.add_argument("--block-rows", type=int, default=4096, help="Index rows scored at a time")
+    parser.add_argument("--max-in-flight", type=int, default=0, help="Chunks queued at once (default: 2 x workers)")
+    parser.add_argument("--model", default="saved_model_2")
+    parser.add_argument("--embeddings", default="query_embeddings_2.pt")
+    parser.add_argument("--commands", default="commands_list_2.pt")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
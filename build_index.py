@@ -0,0 +1,166 @@
+"""
+build_index.py
+
+Builds the search artifacts loaded by app.py from a (user_query, command) CSV.
+Every paraphrase is encoded in its entity-masked form (canonicalize.py, the
+same form app.py encodes queries in) through the shared embedding cache, so a
+rebuild after editing a few rows only encodes those rows. The raw paraphrases
+are saved alongside for the fast path and value re-injection.
+
+The app's compactor folds accepted suggestions (feedback.jsonl) into the same
+artifacts a build overwrites, so a build adds every pair from the feedback log
+to the CSV pairs and marks the log compacted up to where it read.
+
+Usage:
+  python build_index.py                                  # commands.csv -> *_2.pt with saved_model_2
+  python build_index.py --command-column windows --data windows.csv
+  python build_index.py --model all-MiniLM-L6-v2 --suffix _small
+  python build_index.py --cascade                        # large (_2) and small (_small) indexes, same rows
+  python build_index.py --shards 3                       # also *_2_shard{i}of3.pt for TEXT2CMD_SHARD=i/3
+  python build_index.py --feedback ""                    # CSV pairs only (drops learned pairs)
+
+Stop the app first: its compactor would overwrite a rebuild with its own rows.
+
+Each build also writes the per-command centroids used by the two-level search
+(centroid_index.py).
+"""
+
+import argparse
+import csv
+import random
+from collections import defaultdict
+from typing import List, Tuple
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+from canonicalize import canonicalize
+from centroid_index import CentroidIndex
+from command_index import CommandIndex, shard_suffix
+from embedding_cache import cached_encode
+from feedback import FEEDBACK_LOG, FeedbackLog
+
+
+DEFAULT_MODEL = "saved_model_2"
+DEFAULT_DATA = "commands.csv"
+SMALL_MODEL = "all-MiniLM-L6-v2"   # cascade first stage (see cascade.py)
+SMALL_SUFFIX = "_small"
+
+
+def artifact_paths(suffix: str = "_2") -> dict:
+    return {
+        "embeddings": f"query_embeddings{suffix}.pt",
+        "commands": f"commands_list{suffix}.pt",
+        "queries": f"queries_list{suffix}.pt",
+        "centroids": f"command_centroids{suffix}.pt",
+    }
+
+
+def load_pairs(path: str = DEFAULT_DATA, command_column: str = "command") -> Tuple[List[str], List[str]]:
+    """Read (user_query, command) pairs, skipping rows with an empty query or command."""
+    queries, commands = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            q, c = (row.get("user_query") or "").strip(), (row.get(command_column) or "").strip()
+            if q and c:
+                queries.append(q)
+                commands.append(c)
+    return queries, commands
+
+
+def add_feedback(queries: List[str], commands: List[str], log: FeedbackLog) -> Tuple[List[str], List[str], int]:
+    """The pairs plus the feedback log's pairs they lack, and the log offset read up to."""
+    queries, commands, end = list(queries), list(commands), 0
+    seen = set(zip(queries, commands))
+    for q, c, offset in log.entries():
+        if (q, c) not in seen:
+            seen.add((q, c))
+            queries.append(q)
+            commands.append(c)
+        end = offset
+    return queries, commands, end
+
+
+def holdout_split(commands: List[str], per_command: int = 1, seed: int = 42) -> Tuple[List[int], List[int]]:
+    """
+    Row indices (train, test) holding out `per_command` paraphrases of every
+    command that has more than that many, chosen reproducibly.
+    """
+    rows = defaultdict(list)
+    for i, c in enumerate(commands):
+        rows[c].append(i)
+    rng = random.Random(seed)
+    test = []
+    for c in sorted(rows):
+        if len(rows[c]) > per_command:
+            test.extend(rng.sample(rows[c], per_command))
+    held = set(test)
+    return [i for i in range(len(commands)) if i not in held], sorted(test)
+
+
+def encode_queries(model_name: str, queries: List[str], model=None) -> torch.Tensor:
+    model = model or SentenceTransformer(model_name)
+    texts = [canonicalize(q).text for q in queries]
+    return torch.from_numpy(cached_encode(model, texts, model_name))
+
+
+def save_artifacts(embeddings: torch.Tensor, commands: List[str], queries: List[str], suffix: str) -> dict:
+    paths = artifact_paths(suffix)
+    torch.save(embeddings, paths["embeddings"])
+    torch.save(commands, paths["commands"])
+    torch.save(queries, paths["queries"])
+    CentroidIndex.build(embeddings, commands).save(paths["centroids"])
+    return paths
+
+
+def build(model_name: str, queries: List[str], commands: List[str], suffix: str = "_2", model=None) -> dict:
+    return save_artifacts(encode_queries(model_name, queries, model), commands, queries, suffix)
+
+
+def build_shards(suffix: str, shards: int) -> List[dict]:
+    """Split a built index into per-shard artifacts, so each shard process loads only its own rows."""
+    paths = artifact_paths(suffix)
+    full = CommandIndex.load(paths["embeddings"], paths["commands"], paths["queries"])
+    out = []
+    for i in range(shards):
+        part = full.partition(i, shards)
+        out.append(save_artifacts(part.embeddings, part.commands, part.queries, shard_suffix(suffix, i, shards)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build query embedding index for app.py")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="CSV with user_query and command columns")
+    parser.add_argument("--command-column", default="command", help="Column holding the command to suggest")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Sentence-transformers model name or saved path")
+    parser.add_argument("--suffix", default="_2", help="Artifact suffix, e.g. _2 -> query_embeddings_2.pt")
+    parser.add_argument("--cascade", action="store_true",
+                        help=f"Also build the small first-stage index ({SMALL_MODEL} -> *{SMALL_SUFFIX}.pt)")
+    parser.add_argument("--shards", type=int, default=0, help="Also split the index into this many shards")
+    parser.add_argument("--feedback", default=FEEDBACK_LOG, help="Accepted-pair log to include ('' to skip)")
+    args = parser.parse_args()
+
+    queries, commands = load_pairs(args.data, args.command_column)
+    log = FeedbackLog(args.feedback) if args.feedback else None
+    if log is not None:
+        n = len(queries)
+        queries, commands, log_end = add_feedback(queries, commands, log)
+        print(f"Adding {len(queries) - n} accepted pairs from {args.feedback}")
+    targets = [(args.model, args.suffix)]
+    if args.cascade:
+        targets.append((SMALL_MODEL, SMALL_SUFFIX))
+    print(f"Indexing {len(queries)} paraphrases of {len(set(commands))} commands")
+    for model_name, suffix in targets:
+        paths = build(model_name, queries, commands, suffix)
+        print(f"[{model_name}]")
+        for name, path in paths.items():
+            print(f"  {name:10s} -> {path}")
+    if args.shards:
+        for i, paths in enumerate(build_shards(args.suffix, args.shards)):
+            print(f"[shard {i}/{args.shards}] -> {paths['embeddings']}")
+    if log is not None:
+        log.mark_compacted(log_end)   # these pairs are in the artifacts now; the app must not replay them
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+canonicalize.py
+
+Entity-masked query canonicalization.
+
+"copy notes.txt to /backup" and "copy report.csv to /tmp" ask for the same
+command. Before encoding, caching or fast-path lookup, the entities found by the
+lexer in entities.py (quoted strings, paths, filenames, numbers) are replaced by
+typed tokens, so both become "copy <file.txt> to <path>" (a filename keeps its
+extension: "show file.gz" and "show file.zst" need different commands). The
+values are kept and re-injected afterwards: the stored paraphrase of the chosen
+row is canonicalized too, and each of its values that appears in the command is
+swapped for the user's value of the same kind, in order. A stored value that
+does not appear in the command ("every 0.5 seconds" -> htop -d 5) cannot be
+swapped, so such a row only answers a query that repeats the value
+(see fixed_values).
+
+Usage:
+    from canonicalize import canonicalize, reinject
+    canonicalize("copy notes.txt to /backup").text                  # 'copy <file.txt> to <path>'
+    reinject("cp file.txt /tmp", "copy file.txt to /tmp", "copy notes.txt to /backup")   # 'cp notes.txt /backup'
+
+Hit rates on a query log, raw text vs canonical text:
+    python canonicalize.py --hit-rates feedback.jsonl
+"""
+
+import argparse
+import csv
+import json
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import List, NamedTuple, Optional
+
+from entities import Entity, entities
+
+
+CANONICAL_KINDS = ("quoted", "path", "filename", "number")
+TYPED_TOKENS = {"quoted": "<str>", "path": "<path>", "filename": "<file>", "number": "<num>"}
+RESULT_CACHE_SIZE = 1024
+PLACEHOLDER_FILES = ['file.txt', 'config.conf', 'script.sh', 'error.log', 'access.log']
+
+
+class Canonical(NamedTuple):
+    text: str
+    values: List[Entity]   # the masked entities, in query order
+
+
+def typed_token(e: Entity) -> str:
+    """<file.gz> for a filename (its extension picks the command), else the kind's token."""
+    if e.kind == "filename":
+        return f"<file.{e.value.rsplit('.', 1)[1]}>"
+    return TYPED_TOKENS[e.kind]
+
+
+def canonicalize(query: str) -> Canonical:
+    values = entities(query, CANONICAL_KINDS)
+    parts, pos = [], 0
+    for e in values:
+        parts.append(query[pos:e.start])      # a quoted entity's span includes its quotes
+        parts.append(typed_token(e))
+        pos = e.end
+    parts.append(query[pos:])
+    return Canonical("".join(parts), values)
+
+
+def _value_pattern(value: str) -> re.Pattern:
+    """Match `value` as a whole token, e.g. "1" but not inside "192.168.1.1" or "file1.txt"."""
+    return re.compile(r"(?<![\w.\-])" + re.escape(value) + r"(?![\w\-]|\.\w)")
+
+
+def _by_kind(values: List[Entity]) -> dict:
+    out = defaultdict(list)
+    for e in values:
+        out[e.kind].append(e.value)
+    return out
+
+
+def mask_command(command: str, stored: Canonical) -> str:
+    """The command with the stored paraphrase's values replaced by typed tokens."""
+    for e in stored.values:
+        command = _value_pattern(e.value).sub(typed_token(e), command)
+    return command
+
+
+def fixed_values(command: str, stored: Canonical) -> dict:
+    """
+    (kind, position within kind) -> value for the stored values that do not
+    appear in `command`: reinject cannot change them, so the row's command is
+    only right for a query with the same values there.
+    """
+    out = {}
+    for kind, values in _by_kind(stored.values).items():
+        for i, value in enumerate(values):
+            if not _value_pattern(value).search(command):
+                out[kind, i] = value
+    return out
+
+
+def keeps_fixed_values(fixed: dict, query: Canonical) -> bool:
+    user = _by_kind(query.values)
+    return all(i < len(user[kind]) and user[kind][i] == value for (kind, i), value in fixed.items())
+
+
+def reinject(command: str, stored_query: str, query: str) -> str:
+    """
+    Swap the values of the paraphrase `command` was stored under for the values
+    of the user's `query`, pairing them by kind and position.
+    """
+    stored, user = _by_kind(canonicalize(stored_query).values), _by_kind(canonicalize(query).values)
+    slots = []
+    for kind, old_values in stored.items():
+        for old, new in zip(old_values, user.get(kind, ())):
+            if old != new:
+                slots.append((old, new))
+    # two phases, so swapping file1.txt -> file2.txt and file2.txt -> x does not chain
+    for i, (old, _) in enumerate(slots):
+        command = _value_pattern(old).sub(f"\0{i}\0", command, count=1)
+    for i, (_, new) in enumerate(slots):
+        command = command.replace(f"\0{i}\0", new)
+    return command
+
+
+def fill_placeholders(cmd: str, query: str) -> str:
+    """Replace common hardcoded filenames in the command with the user-provided file."""
+    filenames = [e.value for e in entities(query, ("filename",))]
+    if filenames:
+        file_name = filenames[0]  # take first detected file
+        for placeholder in PLACEHOLDER_FILES:
+            # whole tokens only: not the "file.txt" inside "file.txt.zst" or "logfile.txt"
+            cmd = _value_pattern(placeholder).sub(lambda m: file_name, cmd)
+    return cmd
+
+
+def fill_command(cmd: str, query: str, paraphrase: Optional[str] = None) -> str:
+    """
+    Put the user's values into `cmd`: re-inject them in place of the values of the
+    paraphrase the row was stored under. Only rows without a stored paraphrase
+    fall back to the placeholder filenames.
+    """
+    if paraphrase is None:
+        return fill_placeholders(cmd, query)
+    return reinject(cmd, paraphrase, query)
+
+
+# ----------------------------
+# Result cache keyed by canonical text
+# ----------------------------
+class ResultCache:
+    """Thread-safe LRU of canonical query text -> search results (raw rows, or rows plus embedding)."""
+
+    def __init__(self, size: int = RESULT_CACHE_SIZE):
+        self.size = size
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            rows = self._rows.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, key: str, rows):
+        with self._lock:
+            self._rows[key] = rows
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.size:
+                self._rows.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._rows), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+# ----------------------------
+# Hit-rate report: raw text vs canonical text
+# ----------------------------
+def read_log(path: str) -> List[str]:
+    """Queries from a feedback .jsonl log, a CSV with a user_query column, or one query per line."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line)["query"] for line in f if line.strip()]
+        if path.endswith(".csv"):
+            return [r["user_query"] for r in csv.DictReader(f) if r.get("user_query")]
+        return [line.strip() for line in f if line.strip()]
+
+
+def hit_rates(log: List[str], data: str = "commands.csv", cache_size: int = RESULT_CACHE_SIZE):
+    from fast_path import ParaphraseLookup
+
+    with open(data, newline="", encoding="utf-8") as f:
+        rows = [(r["user_query"], r["command"]) for r in csv.DictReader(f) if r["user_query"] and r["command"]]
+    queries, commands = [q for q, _ in rows], [c for _, c in rows]
+
+    print(f"{len(log)} logged queries, {len(queries)} indexed paraphrases\n")
+    print(f"{'':10} {'distinct':>8} {'cache hit':>9} {'exact':>7} {'fuzzy':>7}")
+    for name, canonical in (("raw", False), ("canonical", True)):
+        keys = [canonicalize(q).text if canonical else q for q in log]
+        cache = ResultCache(cache_size)
+        for key in keys:
+            if cache.get(key) is None:
+                cache.put(key, [])
+        lookup = ParaphraseLookup(queries, commands, canonical=canonical)
+        kinds = [m.kind if m else None for m in map(lookup.lookup, log)]
+        n = len(log) or 1
+        print(f"{name:10} {len(set(keys)):8d} {cache.stats()['hit_rate']:9.1%} "
+              f"{kinds.count('exact') / n:7.1%} {kinds.count('fuzzy') / n:7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entity-masked query canonicalization")
+    parser.add_argument("--hit-rates", metavar="LOG", help="Report cache / fast-path hit rates for a query log")
+    parser.add_argument("--data", default="commands.csv")
+    parser.add_argument("--cache-size", type=int, default=RESULT_CACHE_SIZE)
+    args = parser.parse_args()
+    if args.hit_rates:
+        hit_rates(read_log(args.hit_rates), args.data, args.cache_size)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+cascade.py
+
+Adaptive two-model cascade for /suggest.
+
+The small encoder (all-MiniLM-L6-v2, several times faster) answers first from
+its own index. The query escalates to the large mpnet-based model only when the
+small model is unsure: its top-1 score is below `min_score`, or the gap between
+the top-1 row and the best row for a *different* command is below `margin`
+(paraphrases of the same command are not counted as competition).
+
+Both indexes come from the same pipeline:
+  python build_index.py --cascade
+
+Accepted feedback pairs are added to both indexes and compacted into both, so
+a confident small stage sees the same rows as the large one.
+
+Tuning / report (held-out paraphrases, one per command); apply the chosen
+thresholds with TEXT2CMD_CASCADE_MARGIN / TEXT2CMD_CASCADE_MIN_SCORE:
+  python cascade.py --report
+"""
+
+import argparse
+import os
+import threading
+import time
+from typing import List, Tuple
+
+import torch
+
+from build_index import SMALL_MODEL, SMALL_SUFFIX, artifact_paths
+from canonicalize import canonicalize
+from command_index import CommandIndex, replay_feedback, to_suggestions
+from feedback import FeedbackLog
+
+
+DEFAULT_MARGIN = float(os.environ.get("TEXT2CMD_CASCADE_MARGIN", 0.05))
+DEFAULT_MIN_SCORE = float(os.environ.get("TEXT2CMD_CASCADE_MIN_SCORE", 0.60))
+PROBE_ROWS = 10   # rows fetched from the small index to find the best competing command
+
+
+def confidence(rows: List[dict]) -> Tuple[float, float]:
+    """(top-1 score, margin to the best row of a different command)."""
+    if not rows:
+        return 0.0, 0.0
+    top = rows[0]
+    rival = next((r["score"] for r in rows[1:] if r["command"] != top["command"]), -1.0)
+    return top["score"], top["score"] - rival
+
+
+class Cascade:
+    def __init__(self, small_model, small_index: CommandIndex, large_model, large_index: CommandIndex,
+                 margin: float = DEFAULT_MARGIN, min_score: float = DEFAULT_MIN_SCORE):
+        self.small_model, self.small_index = small_model, small_index
+        self.large_model, self.large_index = large_model, large_index
+        self.margin, self.min_score = margin, min_score
+        self.total = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, large_model, large_index: CommandIndex, log: FeedbackLog = None, **kwargs) -> "Cascade":
+        """Load the small stage; with `log`, replay pending feedback into it like the large index."""
+        from sentence_transformers import SentenceTransformer
+
+        paths = artifact_paths(SMALL_SUFFIX)
+        small_model = SentenceTransformer(SMALL_MODEL)
+        small_index = CommandIndex.load(paths["embeddings"], paths["commands"], paths["queries"])
+        if log is not None:
+            replay_feedback(small_index, log, small_model, SMALL_MODEL)
+        return cls(small_model, small_index, large_model, large_index, **kwargs)
+
+    def add_feedback(self, query: str, command: str, offset: int):
+        """Mirror an accepted pair (already added to the large index) into the small one."""
+        emb = self.small_model.encode(canonicalize(query).text, convert_to_tensor=True)
+        self.small_index.delta.add(query, command, emb, offset)
+
+    def compact(self, log: FeedbackLog):
+        """
+        Fold both deltas into their artifacts. Only the large index records the log
+        offset, after the small one is written: a crash in between replays the pairs
+        into both on restart (a harmless duplicate in the small index) rather than
+        losing them from one.
+        """
+        self.small_index.compact(log, mark=False)
+        self.large_index.compact(log)
+
+    def is_confident(self, rows: List[dict]) -> bool:
+        top, gap = confidence(rows)
+        return top >= self.min_score and gap >= self.margin
+
+    def suggest(self, query: str, k: int = 3) -> Tuple[List[dict], str, torch.Tensor]:
+        """Returns (suggestions, stage, query embedding of the stage that answered)."""
+        text = canonicalize(query).text
+        emb = self.small_model.encode(text, convert_to_tensor=True)
+        rows = self.small_index.search(emb, k=max(k, PROBE_ROWS))
+        confident = self.is_confident(rows)
+        with self._lock:
+            self.total += 1
+            self.escalated += not confident
+        if confident:
+            return to_suggestions(query, rows[:k], self.small_index), "small", emb
+        emb = self.large_model.encode(text, convert_to_tensor=True)
+        return self.large_index.suggest(query, emb, k), "large", emb
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"queries": self.total, "escalated": self.escalated,
+                    "escalation_rate": self.escalated / self.total if self.total else 0.0,
+                    "margin": self.margin, "min_score": self.min_score}
+
+
+# ----------------------------
+# Report: escalation rate, latency and accuracy over a threshold grid
+# ----------------------------
+def _top1_and_confidence(emb: torch.Tensor, index_emb: torch.Tensor, commands: List[str]):
+    """Per probe: (predicted command, top-1 score, margin) from one batched matmul."""
+    scores = torch.nn.functional.normalize(emb, dim=1) @ torch.nn.functional.normalize(index_emb, dim=1).T
+    top_s, top_i = torch.topk(scores, PROBE_ROWS, dim=1)
+    out = []
+    for s_row, i_row in zip(top_s.tolist(), top_i.tolist()):
+        rows = [{"command": commands[i], "score": s} for s, i in zip(s_row, i_row)]
+        out.append((rows[0]["command"],) + confidence(rows))
+    return out
+
+
+def _latency_ms(model, queries: List[str]) -> float:
+    model.encode(queries[0])
+    t0 = time.perf_counter()
+    for q in queries:
+        model.encode(q, convert_to_tensor=True)
+    return (time.perf_counter() - t0) * 1000 / len(queries)
+
+
+def report(data: str, large_model_name: str, latency_probes: int = 50):
+    from sentence_transformers import SentenceTransformer
+    from build_index import encode_queries, holdout_split, load_pairs
+
+    queries, commands = load_pairs(data)
+    train, test = holdout_split(commands)
+    train_cmds = [commands[i] for i in train]
+    probes = [queries[i] for i in test]
+    labels = [commands[i] for i in test]
+
+    results = {}
+    latency = {}
+    for stage, name in (("small", SMALL_MODEL), ("large", large_model_name)):
+        model = SentenceTransformer(name)
+        emb = encode_queries(name, queries, model)          # cached after the first run
+        results[stage] = _top1_and_confidence(emb[test], emb[train], train_cmds)
+        latency[stage] = _latency_ms(model, probes[:latency_probes])
+
+    small_acc = sum(r[0] == l for r, l in zip(results["small"], labels)) / len(labels)
+    large_acc = sum(r[0] == l for r, l in zip(results["large"], labels)) / len(labels)
+    print(f"{len(probes)} held-out paraphrases, {len(set(train_cmds))} commands")
+    print(f"small only : acc@1 {small_acc:.3f}  {latency['small']:.1f} ms/query")
+    print(f"large only : acc@1 {large_acc:.3f}  {latency['large']:.1f} ms/query\n")
+    print(f"{'margin':>7} {'min_score':>9} {'escalated':>9} {'acc@1':>6} {'ms/query':>8}")
+
+    for min_score in (0.0, 0.5, 0.6, 0.7, 0.8):
+        for margin in (0.0, 0.02, 0.05, 0.1, 0.15):
+            correct = escalated = 0
+            for s, l_res, label in zip(results["small"], results["large"], labels):
+                confident = s[1] >= min_score and s[2] >= margin
+                escalated += not confident
+                correct += (s[0] if confident else l_res[0]) == label
+            esc = escalated / len(labels)
+            ms = latency["small"] + esc * latency["large"]
+            print(f"{margin:7.2f} {min_score:9.2f} {esc:9.1%} {correct / len(labels):6.3f} {ms:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Small/large encoder cascade")
+    parser.add_argument("--report", action="store_true", help="Sweep thresholds on held-out paraphrases")
+    parser.add_argument("--data", default="commands.csv")
+    parser.add_argument("--large-model", default="saved_model_2")
+    args = parser.parse_args()
+    if args.report:
+        report(args.data, args.large_model)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+centroid_index.py
+
+Coarse-to-fine search over command centroids.
+
+Every command has about a dozen paraphrase rows. CentroidIndex keeps one
+centroid per command (the renormalized mean of its normalized paraphrase
+embeddings, ~600 rows instead of ~7.4k). A query first scores the centroids
+to pick the `candidates` best commands, then only those commands' paraphrase
+rows are rescored exactly, so the returned scores are the same cosine
+similarities as the flat scan.
+
+build_index.py writes the centroids next to the other artifacts; app.py turns
+the two-level search on with TEXT2CMD_CENTROIDS=<candidates>.
+
+Recall against the flat scan (held-out paraphrases, one per command):
+  python centroid_index.py --report --candidates 5 10 20 50
+"""
+
+import argparse
+import time
+from typing import List, Optional
+
+import torch
+
+
+DEFAULT_CANDIDATES = 20
+
+
+class CentroidIndex:
+    def __init__(self, centroids: torch.Tensor, commands: List[str], order: torch.Tensor,
+                 offsets: List[int], rows: int):
+        self.centroids = centroids          # [num_commands, dim], unit length
+        self.commands = commands            # command of each centroid
+        self.order = order                  # base rows grouped by command
+        self.offsets = offsets              # command i owns order[offsets[i]:offsets[i + 1]]
+        self.rows = rows                    # base rows this was built from
+
+    def __len__(self):
+        return len(self.commands)
+
+    @classmethod
+    def build(cls, embeddings: torch.Tensor, commands: List[str]) -> "CentroidIndex":
+        ids = {}
+        group = torch.tensor([ids.setdefault(c, len(ids)) for c in commands], dtype=torch.long)
+        normed = torch.nn.functional.normalize(embeddings.float(), dim=1)
+        sums = torch.zeros(len(ids), normed.shape[1], device=normed.device)
+        sums.index_add_(0, group.to(normed.device), normed)
+        counts = torch.bincount(group, minlength=len(ids))
+        offsets = [0] + counts.cumsum(0).tolist()
+        order = torch.argsort(group, stable=True)
+        return cls(torch.nn.functional.normalize(sums, dim=1), list(ids), order, offsets, len(commands))
+
+    def save(self, path: str):
+        torch.save({"centroids": self.centroids.cpu(), "commands": self.commands, "order": self.order,
+                    "offsets": self.offsets, "rows": self.rows}, path)
+
+    @classmethod
+    def load(cls, path: str, rows: int) -> Optional["CentroidIndex"]:
+        """The saved centroids, or None if they were built for a different number of rows."""
+        data = torch.load(path)
+        if data["rows"] != rows:
+            return None
+        return cls(data["centroids"], data["commands"], data["order"], data["offsets"], data["rows"])
+
+    def top_commands(self, query_emb: torch.Tensor, n: int) -> List[int]:
+        q = query_emb.reshape(1, -1).to(self.centroids.device, self.centroids.dtype)
+        q = torch.nn.functional.normalize(q, dim=1)
+        scores = (q @ self.centroids.T)[0]
+        return torch.topk(scores, min(n, len(self.commands))).indices.tolist()
+
+    def candidate_rows(self, query_emb: torch.Tensor, n: int) -> torch.Tensor:
+        """Base rows of the `n` commands whose centroids score best for the query."""
+        return torch.cat([self.order[self.offsets[i]:self.offsets[i + 1]]
+                          for i in self.top_commands(query_emb, n)])
+
+
+# ----------------------------
+# Report: recall of the two-level search against the flat scan
+# ----------------------------
+def report(data: str, model_name: str, candidate_counts: List[int], k: int = 3):
+    from build_index import encode_queries, holdout_split, load_pairs
+
+    queries, commands = load_pairs(data)
+    train, test = holdout_split(commands)
+    index_emb = encode_queries(model_name, queries)            # cached after the first run
+    probes, labels = index_emb[test], [commands[i] for i in test]
+    base, base_cmds = index_emb[train], [commands[i] for i in train]
+    base_normed = torch.nn.functional.normalize(base, dim=1)
+    coarse = CentroidIndex.build(base, base_cmds)
+
+    def flat(q):
+        scores = base_normed @ torch.nn.functional.normalize(q, dim=0)
+        return torch.topk(scores, k).indices
+
+    def two_level(q, n):
+        rows = coarse.candidate_rows(q, n)
+        scores = base_normed[rows] @ torch.nn.functional.normalize(q, dim=0)
+        return rows[torch.topk(scores, min(k, len(rows))).indices], len(rows)
+
+    def timed(fn):
+        t0 = time.perf_counter()
+        out = [fn(q) for q in probes]
+        return out, (time.perf_counter() - t0) * 1000 / len(probes)
+
+    flat_top, flat_ms = timed(flat)
+    flat_acc = sum(base_cmds[int(t[0])] == l for t, l in zip(flat_top, labels)) / len(labels)
+    print(f"{len(probes)} held-out paraphrases, {len(base_cmds)} rows, {len(coarse)} centroids, k={k}")
+    print(f"flat scan  : acc@1 {flat_acc:.3f}  {len(base_cmds):6d} rows/query  {flat_ms:.3f} ms/query\n")
+    print(f"{'candidates':>10} {'recall@k':>8} {'top1 same':>9} {'acc@1':>6} {'rows/query':>10} {'ms/query':>8}")
+    for n in candidate_counts:
+        results, ms = timed(lambda q: two_level(q, n))
+        recall = top1 = correct = scanned = 0
+        for (rows, size), f, label in zip(results, flat_top, labels):
+            got = set(rows.tolist())
+            recall += sum(int(r) in got for r in f) / len(f)
+            top1 += int(rows[0]) == int(f[0])
+            correct += base_cmds[int(rows[0])] == label
+            scanned += len(coarse) + size
+        m = len(labels)
+        print(f"{n:10d} {recall / m:8.3f} {top1 / m:9.3f} {correct / m:6.3f} {scanned / m:10.0f} {ms:8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-level command-centroid index")
+    parser.add_argument("--report", action="store_true", help="Recall of coarse-to-fine search vs the flat scan")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[5, 10, DEFAULT_CANDIDATES, 50])
+    parser.add_argument("--data", default="commands.csv")
+    parser.add_argument("--model", default="saved_model_2")
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    if args.report:
+        report(args.data, args.model, args.candidates, args.k)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
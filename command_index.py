@@ -0,0 +1,231 @@
+"""
+command_index.py
+
+Semantic command index shared by the Flask app and the local daemon:
+the base paraphrase embeddings from build_index.py plus the in-memory
+feedback delta segment, scored together with cosine similarity.
+Queries are encoded in their entity-masked form (see canonicalize.py).
+"""
+
+import os
+import threading
+import zlib
+from typing import List, Optional
+
+import torch
+
+from canonicalize import canonicalize, fill_command
+from centroid_index import CentroidIndex
+from embedding_cache import cached_encode
+from fast_path import ParaphraseLookup
+from feedback import DeltaSegment, FeedbackLog, compact
+
+
+def to_suggestions(query: str, rows: List[dict], index: Optional["CommandIndex"] = None) -> List[dict]:
+    """Turn raw search rows into suggestions with the user's values substituted."""
+    return [{"command": fill_command(r["command"], query, index.paraphrase(r["row"]) if index else None),
+             "score": r["score"], "path": "dense"}
+            for r in rows]
+
+
+def fast_path_suggestion(query: str, match) -> List[dict]:
+    """Single suggestion for a fast-path (exact / fuzzy paraphrase) hit."""
+    return [{"command": fill_command(match.command, query, match.query), "score": match.score,
+             "path": match.kind, "matched": match.query}]
+
+
+def build_fast_path(index: "CommandIndex"):
+    """Paraphrase lookup over the index rows, or None if the index has no paraphrase list."""
+    if index.queries is None:
+        return None
+    lookup = ParaphraseLookup(index.queries, index.commands, canonical=True)
+    for q, c in zip(index.delta.queries, index.delta.commands):
+        lookup.add(q, c)
+    return lookup
+
+
+def load_fast_path(queries_path: str = "queries_list_2.pt", commands_path: str = "commands_list_2.pt"):
+    """Paraphrase lookup over saved artifacts, without loading their embeddings."""
+    return ParaphraseLookup(torch.load(queries_path), torch.load(commands_path), canonical=True)
+
+
+def shard_of(command: str, shards: int) -> int:
+    """Stable partition of a command, so all of its paraphrases land on the same shard."""
+    return zlib.crc32(command.encode("utf-8")) % shards
+
+
+def shard_suffix(suffix: str, shard: int, shards: int) -> str:
+    """Artifact suffix of one partition, e.g. _2 -> _2_shard0of3 (query_embeddings_2_shard0of3.pt)."""
+    return f"{suffix}_shard{shard}of{shards}"
+
+
+def allowed(commands: list) -> set:
+    return {c.split(" : ")[0] for c in commands}
+
+
+class CommandIndex:
+    def __init__(self, embeddings: torch.Tensor, commands: list, queries: Optional[list] = None,
+                 embeddings_path: Optional[str] = None, commands_path: Optional[str] = None,
+                 queries_path: Optional[str] = None):
+        self.embeddings = embeddings
+        self.commands = commands
+        self.queries = queries
+        self.pairs = set(zip(queries, commands)) if queries is not None else set()   # base (query, command) rows
+        self.embeddings_path = embeddings_path
+        self.commands_path = commands_path
+        self.queries_path = queries_path
+        self.delta = DeltaSegment()
+        self.lock = threading.Lock()
+        self.allowlist: Optional[set] = None   # set on shards: the full index's commands
+        self.coarse: Optional[CentroidIndex] = None
+        self.candidates = 0
+
+    @classmethod
+    def load(cls, embeddings_path: str = "query_embeddings_2.pt", commands_path: str = "commands_list_2.pt",
+             queries_path: Optional[str] = "queries_list_2.pt",
+             allowlist_path: Optional[str] = None) -> "CommandIndex":
+        """`allowlist_path`: on a shard, the full index's command list, so /run allows every command."""
+        embeddings = torch.load(embeddings_path)   # tensor of shape [num_paraphrases, embedding_dim]
+        commands = torch.load(commands_path)       # command for each row, in the same order
+        queries = torch.load(queries_path) if queries_path and os.path.exists(queries_path) else None
+        if queries is not None and len(queries) != len(commands):
+            queries = None   # stale paraphrase list from an older build; not row-aligned
+        index = cls(embeddings, commands, queries, embeddings_path, commands_path, queries_path)
+        if allowlist_path:
+            index.allowlist = allowed(torch.load(allowlist_path))
+        return index
+
+    def __len__(self):
+        return len(self.commands) + len(self.delta)
+
+    def paraphrase(self, row: int) -> Optional[str]:
+        """The stored user_query of a search row (base rows, then delta rows), if known."""
+        with self.lock:
+            base, queries = len(self.commands), self.queries
+        if row < base:
+            return queries[row] if queries is not None else None
+        delta_queries = self.delta.queries
+        return delta_queries[row - base] if row - base < len(delta_queries) else None
+
+    def contains(self, query: str, command: str) -> bool:
+        """Whether (query, command) is already a row, in the base index or the delta."""
+        with self.lock:
+            pairs = self.pairs
+        return (query, command) in pairs or self.delta.contains(query, command)
+
+    def allowed_commands(self) -> set:
+        base = self.allowlist if self.allowlist is not None else allowed(self.commands)
+        return base | set(self.delta.commands)
+
+    def use_centroids(self, candidates: int, path: Optional[str] = None):
+        """
+        Score command centroids first and rescore only the rows of the best
+        `candidates` commands. Saved centroids are used if they match the index.
+        """
+        with self.lock:
+            coarse = CentroidIndex.load(path, len(self.commands)) if path and os.path.exists(path) else None
+            self.coarse = coarse or CentroidIndex.build(self.embeddings, self.commands)
+            self.candidates = candidates
+
+    def partition(self, shard: int, shards: int) -> "CommandIndex":
+        """
+        The rows of the commands in partition `shard` of `shards`, as a new index
+        with no artifact paths (build_index.py --shards saves them per shard).
+        """
+        keep = [i for i, c in enumerate(self.commands) if shard_of(c, shards) == shard]
+        part = CommandIndex(self.embeddings[torch.tensor(keep, dtype=torch.long)].clone(),
+                            [self.commands[i] for i in keep],
+                            [self.queries[i] for i in keep] if self.queries is not None else None)
+        part.allowlist = self.allowed_commands()
+        if self.coarse is not None:
+            part.use_centroids(self.candidates)
+        return part
+
+    def scores(self, query_emb: torch.Tensor):
+        """
+        Return (scores, rows, candidates): scores of the scanned base rows followed by
+        all delta rows, their row ids, and the command of every row id.
+        """
+        with self.lock:
+            if self.coarse is not None:
+                rows = self.coarse.candidate_rows(query_emb, self.candidates)
+                scores = torch.nn.functional.cosine_similarity(query_emb.unsqueeze(0), self.embeddings[rows])
+            else:
+                rows = torch.arange(len(self.commands))
+                scores = torch.nn.functional.cosine_similarity(query_emb.unsqueeze(0), self.embeddings)
+            delta_scores, delta_commands = self.delta.scores(query_emb)
+            base = len(self.commands)   # under the lock: compaction grows self.commands
+            candidates = self.commands + delta_commands
+        rows = torch.cat([rows, torch.arange(base, len(candidates))])
+        return torch.cat([scores, delta_scores.to(scores.device)]), rows, candidates
+
+    def search(self, query_emb: torch.Tensor, k: int = 3, distinct: bool = False) -> List[dict]:
+        """
+        Raw top-k rows as [{command, score, row}], best first. With distinct, the
+        best row of each of the top k commands: the scan widens until k distinct
+        commands are found or every row has been ranked.
+        """
+        scores, rows, candidates = self.scores(query_emb)
+        fetch = k
+        while True:
+            topk = torch.topk(scores, k=min(fetch, len(scores)))
+            out = [{"command": candidates[row], "score": float(score), "row": row}
+                   for score, row in zip(topk[0].tolist(), rows[topk[1].cpu()].tolist())]
+            if not distinct:
+                return out
+            best = {}
+            for r in out:
+                best.setdefault(r["command"], r)
+            if len(best) >= k or fetch >= len(scores):
+                return list(best.values())[:k]
+            fetch *= 4
+
+    def search_batch(self, query_embs: torch.Tensor, k: int = 3, block_rows: int = 4096):
+        """
+        Top-k base rows for a batch of queries, as (scores, rows) tensors of shape [n, k].
+        The index is scored in blocks of `block_rows` with a running top-k merge,
+        so memory stays at n x block_rows whatever the index size.
+        """
+        q = torch.nn.functional.normalize(query_embs, dim=1)
+        with self.lock:
+            base = self.embeddings
+        k = min(k, base.shape[0])
+        best_scores = torch.full((q.shape[0], k), float("-inf"), device=q.device)
+        best_rows = torch.zeros((q.shape[0], k), dtype=torch.long, device=q.device)
+        for start in range(0, base.shape[0], block_rows):
+            block = base[start:start + block_rows].to(q.device, q.dtype)
+            scores = q @ torch.nn.functional.normalize(block, dim=1).T
+            top_s, top_i = torch.topk(scores, min(k, scores.shape[1]), dim=1)
+            merged_s = torch.cat([best_scores, top_s], dim=1)
+            merged_i = torch.cat([best_rows, top_i + start], dim=1)
+            best_scores, pos = torch.topk(merged_s, k, dim=1)
+            best_rows = merged_i.gather(1, pos)
+        return best_scores, best_rows
+
+    def suggest(self, query: str, query_emb: torch.Tensor, k: int = 3) -> List[dict]:
+        """Top-k suggestions with the user's values substituted into the commands."""
+        return to_suggestions(query, self.search(query_emb, k), self)
+
+    def compact(self, log: FeedbackLog, mark: bool = True) -> bool:
+        """Fold the delta segment into the saved artifacts; True if anything changed."""
+        with self.lock:
+            out = compact(self.embeddings, self.commands, self.delta, log,
+                          self.embeddings_path, self.commands_path, self.queries, self.queries_path, mark)
+            if out is None:
+                return False
+            self.embeddings, self.commands, self.queries = out
+            self.pairs = set(zip(self.queries, self.commands)) if self.queries is not None else set()
+            if self.coarse is not None:
+                self.coarse = CentroidIndex.build(self.embeddings, self.commands)
+            return True
+
+
+def replay_feedback(index: CommandIndex, log: FeedbackLog, model, model_name: str):
+    """Re-add pairs accepted since the last compaction (normally only a handful)."""
+    pending = log.pending()
+    if not pending:
+        return
+    texts = [canonicalize(q).text for q, _, _ in pending]
+    embs = torch.from_numpy(cached_encode(model, texts, model_name))
+    for (q, c, off), emb in zip(pending, embs):
+        index.delta.add(q, c, emb, off)
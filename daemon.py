@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+daemon.py
+
+Long-lived local server that keeps the Sentence-BERT model and command index in
+memory behind a Unix domain socket, so shell use does not pay the torch /
+model load on every command. Pair it with the thin client in tcmd.py.
+
+Protocol: one JSON object per line in each direction, one request per connection.
+  {"op": "suggest", "query": "...", "k": 3}  -> {"suggestions": [{command, score}, ...]}
+  {"op": "intent", "query": "..."}           -> intent-classifier prediction (see temp/nl_2_cmd_intent_classifier.py)
+  {"op": "ping"}                             -> {"ok": true}
+
+Usage:
+  python daemon.py [--socket PATH] [--model saved_model_2]
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+from sentence_transformers import SentenceTransformer
+
+from canonicalize import canonicalize
+from command_index import CommandIndex, build_fast_path, fast_path_suggestion, replay_feedback
+from feedback import FeedbackLog
+from tcmd import socket_path
+
+
+INTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            resp = self.server.dispatch(json.loads(line))
+        except Exception as e:
+            resp = {"error": str(e)}
+        self.wfile.write(json.dumps(resp).encode() + b"\n")
+
+
+class CommandDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, model_name: str, embeddings_path: str, commands_path: str):
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.index = CommandIndex.load(embeddings_path, commands_path)
+        # Read-only view of accepted pairs; compaction stays with app.py
+        replay_feedback(self.index, FeedbackLog(), self.model, model_name)
+        self.fast_path = build_fast_path(self.index)
+        self.encode_lock = threading.Lock()
+        self.intent = None
+        self.model.encode("warm up", convert_to_tensor=True)
+
+        remove_stale_socket(path)
+        super().__init__(path, RequestHandler)
+        os.chmod(path, 0o600)
+
+    def dispatch(self, req: dict) -> dict:
+        op = req.get("op", "suggest")
+        if op == "ping":
+            return {"ok": True}
+        query = req.get("query", "")
+        if op == "suggest":
+            hit = self.fast_path.lookup(query) if self.fast_path is not None else None
+            if hit is not None:
+                return {"suggestions": fast_path_suggestion(query, hit)}
+            with self.encode_lock:
+                query_emb = self.model.encode(canonicalize(query).text, convert_to_tensor=True)
+            return {"suggestions": self.index.suggest(query, query_emb, k=int(req.get("k", 3)))}
+        if op == "intent":
+            return self.predict_intent(query)
+        return {"error": f"unknown op {op!r}"}
+
+    def predict_intent(self, query: str) -> dict:
+        if self.intent is None:
+            sys.path.insert(0, INTENT_DIR)
+            import nl_2_cmd_intent_classifier as nl2cmd
+            self.intent = (nl2cmd, *nl2cmd.load_model())
+        nl2cmd, vect, clf = self.intent
+        return nl2cmd.predict_query(query, vect, clf)
+
+
+def remove_stale_socket(path: str):
+    """Refuse to start twice; clean up a socket file left by a crashed daemon."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise SystemExit(f"daemon already running on {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Command suggestion daemon")
+    parser.add_argument("--socket", default=socket_path(), help="Unix socket path")
+    parser.add_argument("--model", default="saved_model_2", help="Sentence-transformers model name or path")
+    parser.add_argument("--embeddings", default="query_embeddings_2.pt")
+    parser.add_argument("--commands", default="commands_list_2.pt")
+    args = parser.parse_args()
+
+    server = CommandDaemon(args.socket, args.model, args.embeddings, args.commands)
+    print(f"[daemon] ready on {args.socket} ({len(server.index)} rows)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+embedding_cache.py
+
+Content-addressed on-disk cache for sentence embeddings.
+
+Entries are keyed by (model key, sha1 of the text), so a row whose text did not
+change is never encoded twice, across runs and across scripts. Lookups are done
+in batches and only the misses are sent to the model, also in batches.
+
+Usage:
+    from embedding_cache import cached_encode
+    emb = cached_encode(model, texts, "all-MiniLM-L6-v2")   # np.ndarray [len(texts), dim]
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+CACHE_PATH = os.environ.get("EMBEDDING_CACHE", ".embedding_cache.sqlite")
+LOOKUP_CHUNK = 500   # stay well below sqlite's bound-parameter limit
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _fingerprint(path: str) -> str:
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fn in sorted(files):
+            full = os.path.join(root, fn)
+            st = os.stat(full)
+            rel = os.path.relpath(full, path)
+            h.update(f"{rel}:{st.st_size}:{int(st.st_mtime)}\n".encode())
+    return h.hexdigest()[:12]
+
+
+def _hub_snapshot(name: str) -> Optional[str]:
+    """Commit hash of the downloaded snapshot of a hub model, from the local HF cache."""
+    hub = os.environ.get("HF_HUB_CACHE") or os.path.join(
+        os.environ.get("HF_HOME", os.path.join(os.path.expanduser("~"), ".cache", "huggingface")), "hub")
+    repos = [name] if "/" in name else [name, f"sentence-transformers/{name}"]
+    for repo in repos:
+        repo_dir = os.path.join(hub, "models--" + repo.replace("/", "--"))
+        try:
+            with open(os.path.join(repo_dir, "refs", "main")) as f:
+                return f.read().strip()[:12]
+        except OSError:
+            pass
+        snapshots = os.path.join(repo_dir, "snapshots")
+        if os.path.isdir(snapshots):   # offline copy without refs: newest snapshot
+            newest = max(os.scandir(snapshots), key=lambda e: e.stat().st_mtime, default=None)
+            if newest is not None:
+                return newest.name[:12]
+    return None
+
+
+def model_key(name_or_path: str, revision: Optional[str] = None) -> Optional[str]:
+    """
+    Identify a model for cache purposes.
+    A local saved model directory is keyed by a fingerprint of its files, so
+    re-saving a model invalidates it. Hub names are keyed by the explicit
+    revision, else by the commit hash of the snapshot in the local HF cache, so
+    an upstream update invalidates them too. Returns None when no revision can
+    be pinned; such models are encoded without the cache.
+    """
+    if os.path.isdir(name_or_path):
+        name = os.path.basename(os.path.abspath(name_or_path))
+        return f"{name}@{revision or _fingerprint(name_or_path)}"
+    revision = revision or _hub_snapshot(name_or_path)
+    return f"{name_or_path}@{revision}" if revision else None
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Batch lookup; returns {text_hash: vector} for the hashes that are cached."""
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), LOOKUP_CHUNK):
+                chunk = hashes[i:i + LOOKUP_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vec FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *chunk],
+                )
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vec) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()],
+            )
+            self.conn.commit()
+
+    def encode(self, model, texts: List[str], key: Optional[str], batch_size: int = 256) -> np.ndarray:
+        """
+        Return embeddings for `texts` (in order), encoding only cache misses.
+        Duplicate texts inside one call are encoded once.
+        """
+        texts = [str(t) for t in texts]
+        if key is None:      # revision unknown: never serve or store possibly stale vectors
+            if not texts:
+                return np.zeros((0, 0), dtype=np.float32)
+            return model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+        hashes = [text_hash(t) for t in texts]
+        found = self.get_many(key, list(dict.fromkeys(hashes)))
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        if missing:
+            miss_hashes = list(missing)
+            for i in range(0, len(miss_hashes), batch_size):
+                batch = miss_hashes[i:i + batch_size]
+                vecs = model.encode([missing[h] for h in batch], batch_size=batch_size,
+                                    convert_to_numpy=True)
+                new = dict(zip(batch, vecs.astype(np.float32)))
+                self.put_many(key, new)
+                found.update(new)
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[h] for h in hashes])
+
+    def close(self):
+        self.conn.close()
+
+
+_default_cache = None
+
+
+def default_cache() -> EmbeddingCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
+
+
+def cached_encode(model, texts, model_name: str, revision: Optional[str] = None,
+                  batch_size: int = 256) -> np.ndarray:
+    """Encode `texts` with `model` (loaded from `model_name`) through the shared on-disk cache."""
+    key = model_key(model_name, revision)
+    return default_cache().encode(model, list(texts), key, batch_size=batch_size)
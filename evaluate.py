@@ -0,0 +1,267 @@
+"""
+evaluate.py
+
+Retrieval quality vs speed for every index configuration.
+
+Paraphrases are held out per command from commands.csv (build_index.holdout_split);
+the rest form the index. Every retrieval mode ranks all held-out probes in one
+vectorized batch, and is scored on:
+  - recall@1 / recall@3  (true command among the top 1 / 3 distinct commands)
+  - MRR                  (reciprocal rank of the true command, first RANK_DEPTH rows)
+  - ms/query             (single-query encode + search, as /suggest runs it)
+  - index memory         (bytes the mode keeps resident besides the model)
+followed by the Pareto frontier of recall@1 vs latency.
+
+Modes: flat, centroids-N (centroid_index.py), fast-path (fast_path.py, then flat),
+small (SMALL_MODEL flat) and cascade (cascade.py). New index options register
+a mode in MODES.
+
+Usage:
+  python evaluate.py                                   # all modes
+  python evaluate.py --modes flat centroids-20 --holdout 2
+  python evaluate.py --save eval_baseline.json         # record a baseline
+  python evaluate.py --check eval_baseline.json        # regression gate: exit 1 if quality drops
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+import torch
+
+from build_index import DEFAULT_MODEL, SMALL_MODEL, encode_queries, holdout_split, load_pairs
+from canonicalize import canonicalize
+from cascade import DEFAULT_MARGIN, DEFAULT_MIN_SCORE, PROBE_ROWS, confidence
+from centroid_index import CentroidIndex
+from command_index import CommandIndex
+from fast_path import ParaphraseLookup
+
+
+RANK_DEPTH = 30          # rows ranked per probe before deduping to commands
+LATENCY_PROBES = 50
+DEFAULT_TOLERANCE = 0.01
+
+
+# ----------------------------
+# 1. Shared evaluation data
+# ----------------------------
+class EvalSet:
+    def __init__(self, data: str, per_command: int):
+        queries, commands = load_pairs(data)
+        self.train, self.test = holdout_split(commands, per_command)
+        self.queries, self.commands = queries, commands
+        self.train_queries = [queries[i] for i in self.train]
+        self.train_cmds = [commands[i] for i in self.train]
+        self.probes = [queries[i] for i in self.test]
+        self.labels = [commands[i] for i in self.test]
+        self._emb, self._models = {}, {}
+
+    def model(self, name: str):
+        if name not in self._models:
+            from sentence_transformers import SentenceTransformer
+            self._models[name] = SentenceTransformer(name)
+        return self._models[name]
+
+    def embeddings(self, name: str):
+        """(index rows, probes) for a model, through the embedding cache."""
+        if name not in self._emb:
+            emb = encode_queries(name, self.queries, self.model(name))
+            self._emb[name] = (emb[self.train], emb[self.test])
+        return self._emb[name]
+
+    def encode_ms(self, name: str) -> float:
+        model = self.model(name)
+        sample = [canonicalize(q).text for q in self.probes[:LATENCY_PROBES]]
+        model.encode(sample[0])
+        t0 = time.perf_counter()
+        for text in sample:
+            model.encode(text, convert_to_tensor=True)
+        return (time.perf_counter() - t0) * 1000 / len(sample)
+
+
+def ranked_rows(probe_emb: torch.Tensor, base_emb: torch.Tensor, mask: torch.Tensor = None):
+    """Top RANK_DEPTH (scores, rows) per probe from one normalized matmul; masked rows are skipped."""
+    scores = torch.nn.functional.normalize(probe_emb, dim=1) @ torch.nn.functional.normalize(base_emb, dim=1).T
+    if mask is not None:
+        scores = scores.masked_fill(~mask, float("-inf"))
+    top = torch.topk(scores, min(RANK_DEPTH, scores.shape[1]), dim=1)
+    return top.values.tolist(), top.indices.tolist()
+
+
+def command_ranking(rows: List[int], scores: List[float], commands: List[str]) -> List[str]:
+    out, seen = [], set()
+    for r, s in zip(rows, scores):
+        if s == float("-inf"):
+            break
+        if commands[r] not in seen:
+            seen.add(commands[r])
+            out.append(commands[r])
+    return out
+
+
+def search_ms(index: CommandIndex, probe_emb: torch.Tensor) -> float:
+    sample = probe_emb[:LATENCY_PROBES]
+    index.search(sample[0], k=3)
+    t0 = time.perf_counter()
+    for q in sample:
+        index.search(q, k=3)
+    return (time.perf_counter() - t0) * 1000 / len(sample)
+
+
+def tensor_bytes(*tensors) -> int:
+    return sum(t.element_size() * t.nelement() for t in tensors)
+
+
+# ----------------------------
+# 2. Retrieval modes: each returns (rankings, ms/query, index bytes)
+# ----------------------------
+def flat_mode(ev: EvalSet, model_name: str = DEFAULT_MODEL):
+    base, probes = ev.embeddings(model_name)
+    scores, rows = ranked_rows(probes, base)
+    rankings = [command_ranking(r, s, ev.train_cmds) for r, s in zip(rows, scores)]
+    ms = ev.encode_ms(model_name) + search_ms(CommandIndex(base, ev.train_cmds), probes)
+    return rankings, ms, tensor_bytes(base)
+
+
+def centroid_mode(ev: EvalSet, candidates: int):
+    base, probes = ev.embeddings(DEFAULT_MODEL)
+    coarse = CentroidIndex.build(base, ev.train_cmds)
+    # batch form of CentroidIndex.candidate_rows: keep the rows of each probe's top commands
+    centroid_scores = torch.nn.functional.normalize(probes, dim=1) @ coarse.centroids.T
+    top = torch.topk(centroid_scores, min(candidates, len(coarse)), dim=1).indices
+    chosen = torch.zeros(len(probes), len(coarse), dtype=torch.bool)
+    chosen[torch.arange(len(probes)).unsqueeze(1), top] = True
+    group = torch.empty(len(ev.train_cmds), dtype=torch.long)
+    for i in range(len(coarse)):
+        group[coarse.order[coarse.offsets[i]:coarse.offsets[i + 1]]] = i
+    scores, rows = ranked_rows(probes, base, chosen[:, group])
+    rankings = [command_ranking(r, s, ev.train_cmds) for r, s in zip(rows, scores)]
+
+    index = CommandIndex(base, ev.train_cmds)
+    index.use_centroids(candidates)
+    ms = ev.encode_ms(DEFAULT_MODEL) + search_ms(index, probes)
+    return rankings, ms, tensor_bytes(base, coarse.centroids, coarse.order)
+
+
+def fast_path_mode(ev: EvalSet):
+    flat_rankings, flat_ms, flat_bytes = flat_mode(ev)
+    tracemalloc.start()
+    lookup = ParaphraseLookup(ev.train_queries, ev.train_cmds, canonical=True)
+    lookup_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    hits = [lookup.lookup(q) for q in ev.probes]
+    lookup_ms = (time.perf_counter() - t0) * 1000 / len(ev.probes)
+    rankings = [[h.command] + [c for c in r if c != h.command] if h else r for h, r in zip(hits, flat_rankings)]
+    miss_rate = sum(h is None for h in hits) / len(hits)
+    return rankings, lookup_ms + miss_rate * flat_ms, flat_bytes + lookup_bytes
+
+
+def small_mode(ev: EvalSet):
+    return flat_mode(ev, SMALL_MODEL)
+
+
+def cascade_mode(ev: EvalSet, margin: float = DEFAULT_MARGIN, min_score: float = DEFAULT_MIN_SCORE):
+    small_rankings, small_ms, small_bytes = flat_mode(ev, SMALL_MODEL)
+    large_rankings, large_ms, large_bytes = flat_mode(ev, DEFAULT_MODEL)
+    base, probes = ev.embeddings(SMALL_MODEL)
+    scores, rows = ranked_rows(probes, base)
+    escalated = []
+    for s, r in zip(scores, rows):
+        rows_seen = zip(s[:PROBE_ROWS], r[:PROBE_ROWS])   # the same window Cascade.suggest looks at
+        top, gap = confidence([{"command": ev.train_cmds[i], "score": v} for v, i in rows_seen])
+        escalated.append(top < min_score or gap < margin)
+    rankings = [l if e else s for e, s, l in zip(escalated, small_rankings, large_rankings)]
+    ms = small_ms + sum(escalated) / len(escalated) * large_ms
+    return rankings, ms, small_bytes + large_bytes
+
+
+MODES = {
+    "flat": flat_mode,
+    "centroids-10": lambda ev: centroid_mode(ev, 10),
+    "centroids-20": lambda ev: centroid_mode(ev, 20),
+    "centroids-50": lambda ev: centroid_mode(ev, 50),
+    "fast-path": fast_path_mode,
+    "small": small_mode,
+    "cascade": cascade_mode,
+}
+
+
+# ----------------------------
+# 3. Metrics, Pareto table, regression gate
+# ----------------------------
+def quality(rankings: List[List[str]], labels: List[str]) -> Dict[str, float]:
+    r1 = r3 = mrr = 0.0
+    for ranking, label in zip(rankings, labels):
+        rank = ranking.index(label) + 1 if label in ranking else 0
+        r1 += rank == 1
+        r3 += 0 < rank <= 3
+        mrr += 1 / rank if rank else 0.0
+    n = len(labels)
+    return {"recall@1": r1 / n, "recall@3": r3 / n, "mrr": mrr / n}
+
+
+def pareto(results: Dict[str, dict]) -> List[str]:
+    """Modes no other mode beats on both recall@1 and latency."""
+    return [m for m, r in results.items()
+            if not any(o["recall@1"] >= r["recall@1"] and o["ms"] <= r["ms"]
+                       and (o["recall@1"] > r["recall@1"] or o["ms"] < r["ms"])
+                       for other, o in results.items() if other != m)]
+
+
+def print_table(results: Dict[str, dict], n_probes: int):
+    front = pareto(results)
+    print(f"{n_probes} held-out paraphrases\n")
+    print(f"{'mode':14} {'recall@1':>8} {'recall@3':>8} {'MRR':>6} {'ms/query':>8} {'index MB':>8}  pareto")
+    for m, r in results.items():
+        print(f"{m:14} {r['recall@1']:8.3f} {r['recall@3']:8.3f} {r['mrr']:6.3f} {r['ms']:8.2f} "
+              f"{r['bytes'] / 2**20:8.1f}  {'*' if m in front else ''}")
+    print("\nPareto frontier (fastest first):")
+    for m in sorted(front, key=lambda m: results[m]["ms"]):
+        print(f"  {m:14} recall@1 {results[m]['recall@1']:.3f} at {results[m]['ms']:.2f} ms/query")
+
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Quality drops beyond `tolerance` against a saved run (latency is machine-dependent, not gated)."""
+    out = []
+    for m, r in results.items():
+        for metric in ("recall@1", "recall@3", "mrr"):
+            if m in baseline and r[metric] < baseline[m][metric] - tolerance:
+                out.append(f"{m}: {metric} {r[metric]:.3f} < baseline {baseline[m][metric]:.3f}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality vs speed sweep")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--data", default="commands.csv")
+    parser.add_argument("--holdout", type=int, default=1, help="Paraphrases held out per command")
+    parser.add_argument("--save", metavar="JSON", help="Write the results as a baseline")
+    parser.add_argument("--check", metavar="JSON", help="Exit 1 if any metric falls below this baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    ev = EvalSet(args.data, args.holdout)
+    results = {}
+    for m in args.modes:
+        rankings, ms, nbytes = MODES[m](ev)
+        results[m] = dict(quality(rankings, ev.labels), ms=ms, bytes=nbytes)
+    print_table(results, len(ev.probes))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.check:
+        with open(args.check) as f:
+            failed = regressions(results, json.load(f), args.tolerance)
+        for line in failed:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
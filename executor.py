@@ -0,0 +1,242 @@
+"""
+executor.py
+
+Bounded pool of pre-started sandbox workers that run allowlisted commands for /run.
+
+The Flask process never forks per request. A fixed number of small worker
+processes (this file run with --worker, standard library only) are started up
+front. Each job they receive gets:
+  - setrlimit ceilings for CPU seconds, address space and file size,
+  - a fresh working directory that is removed afterwards,
+  - argv-based exec when the command has no shell syntax (/bin/sh -c otherwise),
+  - a wall-clock timeout that kills the whole process group.
+
+Jobs wait in a bounded queue; when it is full, submit() raises QueueFull so the
+caller can answer 503 instead of piling up work. submit() never waits forever:
+a job that no worker picks up in time is dropped, and a worker that does not
+answer shortly after the job timeout is killed and replaced. Queue wait and run
+time are recorded for /metrics.
+"""
+
+import json
+import os
+import queue
+import re
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, jobs still run through the pool
+    resource = None
+
+
+# Anything a plain argv exec would not interpret the way a shell does
+SHELL_SYNTAX = re.compile(r"""[|&;<>()$`\\"'*?\[\]{}~#\n]|(?:^|\s)\w+=""")
+MAX_OUTPUT = 64 * 1024   # bytes of stdout/stderr returned per job
+RESULT_GRACE = 2.0       # seconds past the job timeout before a worker counts as wedged
+
+DEFAULT_LIMITS = {
+    "cpu_seconds": 5,
+    "memory_bytes": 512 * 1024 * 1024,
+    "file_bytes": 16 * 1024 * 1024,
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ----------------------------
+# 1. Worker side (runs in the pre-started process)
+# ----------------------------
+def _apply_limits(limits: dict):
+    os.setsid()  # own process group, so a timeout can kill everything it spawned
+    if resource is None:
+        return
+    cpu = limits["cpu_seconds"]
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (limits["memory_bytes"],) * 2)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limits["file_bytes"],) * 2)
+
+
+def _read_capped(path: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read(MAX_OUTPUT + 1)
+    text = data[:MAX_OUTPUT].decode("utf-8", errors="replace")
+    return text + ("\n[output truncated]" if len(data) > MAX_OUTPUT else "")
+
+
+def run_job(command: str, timeout: float, limits: dict) -> dict:
+    argv = ["/bin/sh", "-c", command] if SHELL_SYNTAX.search(command) else shlex.split(command)
+    job_dir = tempfile.mkdtemp(prefix="text2cmd-job-")
+    work_dir = os.path.join(job_dir, "work")
+    os.mkdir(work_dir)
+    out_path, err_path = os.path.join(job_dir, "stdout"), os.path.join(job_dir, "stderr")
+    try:
+        # Output goes to files so RLIMIT_FSIZE also bounds it
+        with open(out_path, "wb") as out, open(err_path, "wb") as err:
+            try:
+                proc = subprocess.Popen(argv, cwd=work_dir, stdin=subprocess.DEVNULL, stdout=out, stderr=err,
+                                        preexec_fn=(lambda: _apply_limits(limits)) if os.name == "posix" else None)
+            except OSError as e:
+                return {"error": str(e)}
+            try:
+                returncode = proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except (ProcessLookupError, AttributeError):   # AttributeError: no killpg on Windows
+                    proc.kill()
+                proc.wait()
+                return {"error": f"Command timed out after {timeout}s"}
+        return {"stdout": _read_capped(out_path), "stderr": _read_capped(err_path), "returncode": returncode}
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def worker_main():
+    """Read one JSON job per line on stdin, write one JSON result per line on stdout."""
+    for line in sys.stdin:
+        job = json.loads(line)
+        try:
+            result = run_job(job["command"], job["timeout"], job["limits"])
+        except Exception as e:
+            result = {"error": str(e)}
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
+# ----------------------------
+# 2. Pool side (runs in the Flask process)
+# ----------------------------
+class LatencyStats:
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 2) if recent else 0.0
+
+        return {"count": self.count, "mean_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+                "p50_ms": pct(0.50), "p95_ms": pct(0.95), "max_ms": round(self.max * 1000, 2)}
+
+
+class _Job:
+    def __init__(self, command: str):
+        self.command = command
+        self.enqueued = time.monotonic()
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.cancelled = False
+        self.proc = None
+        self.result = None
+
+
+class ExecutorPool:
+    def __init__(self, workers: int = 4, max_queue: int = 32, timeout: float = 5, limits: dict = None):
+        self.timeout = timeout
+        # Longest a healthy pool needs to reach a job at the back of a full queue
+        self.max_queue_wait = -(-max_queue // max(workers, 1)) * (timeout + RESULT_GRACE)
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.queue_wait = LatencyStats()
+        self.run_time = LatencyStats()
+        self.rejected = 0
+        self.timed_out = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        # Spawned here, before __init__ returns, so they are running before the caller goes on
+        procs = [self._spawn() for _ in range(workers)]
+        for i, proc in enumerate(procs):
+            threading.Thread(target=self._dispatch, args=(proc,), name=f"executor-{i}", daemon=True).start()
+
+    @staticmethod
+    def _spawn():
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker"],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+    def _dispatch(self, proc):
+        while True:
+            job = self.jobs.get()
+            started = time.monotonic()
+            with self._lock:
+                if job.cancelled:   # submit() already gave up on it
+                    continue
+                job.proc = proc
+                job.started.set()
+                self.queue_wait.add(started - job.enqueued)
+                self.busy += 1
+            try:
+                proc.stdin.write(json.dumps({"command": job.command, "timeout": self.timeout,
+                                             "limits": self.limits}) + "\n")
+                line = proc.stdout.readline()
+                if not line:
+                    raise BrokenPipeError("executor worker exited")
+                job.result = json.loads(line)
+            except (OSError, ValueError) as e:
+                job.result = {"error": f"executor failure: {e}"}
+                proc.kill()
+                proc = self._spawn()
+            finally:
+                with self._lock:
+                    self.run_time.add(time.monotonic() - started)
+                    self.busy -= 1
+                job.done.set()
+
+    def submit(self, command: str) -> dict:
+        """Run `command` on a worker and wait for its result; raises QueueFull under back-pressure.
+
+        Returns an {"error": ...} result instead of blocking forever when no worker
+        takes the job in time or the worker does not answer within timeout + RESULT_GRACE.
+        """
+        job = _Job(command)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull("executor queue is full")
+        if not job.started.wait(self.max_queue_wait):
+            with self._lock:
+                if not job.started.is_set():
+                    job.cancelled = True
+                    self.timed_out += 1
+                    return {"error": "executor busy: no worker took the job in time"}
+        if not job.done.wait(self.timeout + RESULT_GRACE):
+            # Killing the worker makes its dispatcher see EOF and start a fresh one
+            job.proc.kill()
+            with self._lock:
+                self.timed_out += 1
+            return {"error": f"executor worker did not answer within {self.timeout + RESULT_GRACE}s"}
+        return job.result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"queued": self.jobs.qsize(), "busy": self.busy, "rejected": self.rejected,
+                    "timed_out": self.timed_out, "queue_wait": self.queue_wait.snapshot(), "run_time": self.run_time.snapshot()}
+
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        worker_main()
+    else:
+        print("executor.py is started by ExecutorPool; run with --worker only from there.")
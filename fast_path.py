@@ -0,0 +1,186 @@
+"""
+fast_path.py
+
+Exact / near-exact paraphrase lookup that answers before the encoder runs.
+
+A lot of traffic repeats dataset paraphrases verbatim or with a small typo.
+ParaphraseLookup precomputes, over every indexed user_query:
+  - a hash map of normalized text -> command for exact hits,
+  - a character-trigram inverted index for typo candidates.
+
+A fuzzy query only looks at the postings of its rarest trigrams (a string within
+d edits shares all but at most 3*d of the query's trigrams, so it must contain one
+of any 3*d+1 of them), then confirms candidates with a banded edit-distance check.
+Candidates are gathered for d = limit + 1, one more than a hit may use, so every
+rival the ambiguity check below looks for is among them.
+A hit is returned only when it is unambiguous: a normalized text that maps to two
+different commands, or another command's paraphrase within one edit of the best
+distance, falls through to dense search. Typos are only forgiven in the prose:
+flags, entities, typed tokens and `backticked` spans must match the stored
+paraphrase exactly ("Run `vmstat -s`" never hits "Run `vmstat -SM`").
+
+With canonical=True both the indexed paraphrases and the lookups are
+entity-masked first (see canonicalize.py), so "delete notes.txt" hits the stored
+"delete file.txt"; commands are compared with their values masked the same way.
+A row whose command does not contain one of its paraphrase's values (e.g.
+"every 0.5 seconds" -> htop -d 5) only hits queries that repeat that value, since
+re-injection could not carry a different one into the command.
+"""
+
+import re
+import threading
+from array import array
+from collections import defaultdict
+from typing import List, NamedTuple, Optional
+
+from canonicalize import canonicalize, fixed_values, keeps_fixed_values, mask_command
+from entities import entities
+
+
+MAX_EDITS = 2          # absolute cap on typos
+EDIT_RATIO = 0.1       # ...and at most one edit per 10 characters
+MIN_FUZZY_LEN = 12     # short queries are too ambiguous for fuzzy matching
+
+_NON_TEXT = re.compile(r"[^\w./~<>\-]+")   # keeps typed tokens such as <file>
+_BACKTICKED = re.compile(r"`([^`]+)`")
+_TYPED = re.compile(r"<(?:str|path|num|file\.[\w\-]+)>")
+PROTECTED_KINDS = ("quoted", "path", "filename", "flag", "number")
+
+
+class Match(NamedTuple):
+    command: str
+    query: str        # the stored paraphrase that matched
+    kind: str         # "exact" or "fuzzy"
+    distance: int
+    score: float
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_TEXT.sub(" ", text.lower()).split())
+
+
+def protected(text: str) -> tuple:
+    """The tokens a match may not edit, case kept: entities, flags, typed tokens, `backticked` spans."""
+    tokens = {e.value for e in entities(text, PROTECTED_KINDS)}.union(_TYPED.findall(text))
+    for span in _BACKTICKED.findall(text):
+        tokens.update(span.split())
+    return tuple(sorted(tokens))
+
+
+def trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance if it is <= limit, else limit + 1 (banded DP with early exit)."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    big = limit + 1
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [big] * (len(b) + 1)
+        cur[0] = i if i <= limit else big
+        ca = a[i - 1]
+        best = cur[0]
+        for j in range(lo, hi + 1):
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+            cur[j] = v
+            if v < best:
+                best = v
+        if best > limit:
+            return big
+        prev = cur
+    return min(prev[len(b)], big)
+
+
+class ParaphraseLookup:
+    def __init__(self, queries: List[str], commands: List[str], canonical: bool = False):
+        self.canonical = canonical
+        self._lock = threading.Lock()
+        self.norms: List[str] = []
+        self.commands: List[str] = []
+        self.keys: List[str] = []            # command as compared for ambiguity (masked if canonical)
+        self.queries: List[str] = []
+        self.protected: List[tuple] = []
+        self.fixed: List[dict] = []          # stored values re-injection cannot replace (canonical only)
+        self.exact = {}                      # normalized text -> row, or None if it maps to >1 command
+        self.postings = defaultdict(lambda: array("I"))
+        for q, c in zip(queries, commands):
+            self.add(q, c)
+
+    def __len__(self):
+        return len(self.norms)
+
+    def add(self, query: str, command: str):
+        key, fixed = command, {}
+        if self.canonical:
+            c = canonicalize(query)
+            text, key, fixed = c.text, mask_command(command, c), fixed_values(command, c)
+        else:
+            text = query
+        norm = normalize(text)
+        if not norm:
+            return
+        with self._lock:
+            row = len(self.norms)
+            self.norms.append(norm)
+            self.commands.append(command)
+            self.keys.append(key)
+            self.queries.append(query)
+            self.protected.append(protected(text))
+            self.fixed.append(fixed)
+            if norm in self.exact:
+                prev = self.exact[norm]
+                if prev is not None and self.keys[prev] != key:
+                    self.exact[norm] = None
+            else:
+                self.exact[norm] = row
+            for g in trigrams(norm):
+                self.postings[g].append(row)
+
+    def lookup(self, query: str) -> Optional[Match]:
+        """Best stored paraphrase; the caller re-injects the query's values into its command."""
+        c = canonicalize(query) if self.canonical else None
+        text = c.text if c else query
+        norm = normalize(text)
+        if not norm:
+            return None
+        if norm in self.exact:
+            row = self.exact[norm]
+            if row is None or not self._answers(row, text, c):
+                return None
+            return Match(self.commands[row], self.queries[row], "exact", 0, 1.0)
+        if len(norm) < MIN_FUZZY_LEN:
+            return None
+
+        limit = min(MAX_EDITS, int(len(norm) * EDIT_RATIO))
+        grams = sorted(trigrams(norm), key=lambda g: len(self.postings.get(g, ())))
+        candidates = set()
+        for g in grams[:3 * (limit + 1) + 1]:
+            candidates.update(self.postings.get(g, ()))
+
+        # distances up to limit + 1, so a runner-up one edit behind the best is seen
+        distances = {}
+        for row in candidates:
+            d = bounded_levenshtein(norm, self.norms[row], limit + 1)
+            if d <= limit + 1:
+                distances[row] = d
+        best = min(distances.values(), default=limit + 1)
+        if best > limit:
+            return None
+        if len({self.keys[r] for r, d in distances.items() if d <= best + 1}) != 1:
+            return None
+        row = min(r for r, d in distances.items() if d == best)
+        if not self._answers(row, text, c):
+            return None
+        return Match(self.commands[row], self.queries[row], "fuzzy", best, 1.0 - best / len(norm))
+
+    def _answers(self, row: int, text: str, c) -> bool:
+        """The row's command is right for the query: same protected tokens (e.g. -s vs -S), no fixed value differs."""
+        if self.protected[row] != protected(text):
+            return False
+        return c is None or keeps_fixed_values(self.fixed[row], c)
@@ -0,0 +1,188 @@
+"""
+feedback.py
+
+Captures accepted suggestions as new labelled (query, command) pairs.
+
+  - FeedbackLog appends every accepted pair to a JSONL file and remembers how
+    much of it has already been folded into the base index.
+  - DeltaSegment keeps the embeddings of pairs accepted since the last
+    compaction in memory, so they are searched alongside the main index.
+  - compact() appends the delta rows to the saved .pt artifacts without
+    re-encoding the dataset.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import torch
+
+
+FEEDBACK_LOG = "feedback.jsonl"
+
+
+# ----------------------------
+# 1. Append-only feedback log
+# ----------------------------
+class FeedbackLog:
+    def __init__(self, path: str = FEEDBACK_LOG):
+        self.path = path
+        self.offset_path = path + ".compacted"
+        self._lock = threading.Lock()
+
+    def append(self, query: str, command: str) -> int:
+        """Write one accepted pair and return the log offset just past it."""
+        line = json.dumps({"query": query, "command": command, "ts": time.time()})
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                return f.tell()
+
+    def compacted_offset(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def mark_compacted(self, offset: int):
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def pending(self) -> List[Tuple[str, str, int]]:
+        """Entries written after the last compaction, as (query, command, end_offset)."""
+        return self.entries(self.compacted_offset())
+
+    def entries(self, start: int = 0) -> List[Tuple[str, str, int]]:
+        """Complete entries from byte offset `start` on, as (query, command, end_offset)."""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            for raw in iter(f.readline, b""):
+                if not raw.endswith(b"\n"):
+                    break  # torn write from a crash; ignore the partial line
+                rec = json.loads(raw)
+                entries.append((rec["query"], rec["command"], f.tell()))
+        return entries
+
+
+# ----------------------------
+# 2. In-memory delta segment
+# ----------------------------
+class DeltaSegment:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._embeddings = []
+        self.queries = []
+        self.commands = []
+        self.offsets = []
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.commands)
+
+    def add(self, query: str, command: str, embedding: torch.Tensor, offset: int):
+        with self._lock:
+            self._embeddings.append(embedding.detach().reshape(-1).cpu())
+            self.queries.append(query)
+            self.commands.append(command)
+            self.offsets.append(offset)
+            self._matrix = None
+
+    def contains(self, query: str, command: str) -> bool:
+        return any(q == query and c == command for q, c in zip(self.queries, self.commands))
+
+    def matrix(self) -> Optional[torch.Tensor]:
+        return self.snapshot()[0]
+
+    def snapshot(self) -> Tuple[Optional[torch.Tensor], List[str]]:
+        """Consistent (matrix, commands) view, safe against concurrent add()."""
+        with self._lock:
+            if self._matrix is None and self._embeddings:
+                self._matrix = torch.stack(self._embeddings)
+            return self._matrix, list(self.commands)
+
+    def scores(self, query_emb: torch.Tensor) -> Tuple[torch.Tensor, List[str]]:
+        """Cosine similarity of the query against every delta row, with the matching commands."""
+        m, commands = self.snapshot()
+        if m is None:
+            return torch.empty(0, device=query_emb.device), commands
+        m = m.to(query_emb.device, query_emb.dtype)
+        return torch.nn.functional.cosine_similarity(query_emb.unsqueeze(0), m), commands
+
+    def drop_first(self, n: int):
+        """Forget the first n rows once they have been folded into the base index."""
+        with self._lock:
+            del self._embeddings[:n]
+            del self.queries[:n]
+            del self.commands[:n]
+            del self.offsets[:n]
+            self._matrix = None
+
+
+# ----------------------------
+# 3. Compaction
+# ----------------------------
+def _atomic_save(obj, path: str):
+    tmp = path + ".tmp"
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+
+def compact(base_embeddings: torch.Tensor, base_commands: list, delta: DeltaSegment,
+            log: FeedbackLog, embeddings_path: str, commands_path: str,
+            base_queries: Optional[list] = None, queries_path: Optional[str] = None, mark: bool = True):
+    """
+    Fold the current delta rows into the base artifacts (and the paraphrase list,
+    when the index has one, so it stays row-aligned). With a paraphrase list, a
+    (query, command) pair that is already a base row is not appended again.
+    With mark=False the log offset is left for another index compacted from the
+    same log to record.
+    Returns (embeddings, commands, queries) to swap in, or None when there is nothing to do.
+    """
+    m, delta_commands = delta.snapshot()
+    if m is None:
+        return None
+    n = m.shape[0]
+    keep = list(range(n))
+    if base_queries is not None:
+        seen, keep = set(zip(base_queries, base_commands)), []
+        for i in range(n):
+            pair = (delta.queries[i], delta_commands[i])
+            if pair not in seen:
+                seen.add(pair)
+                keep.append(i)
+    commands = list(base_commands) + [delta_commands[i] for i in keep]
+    rows = m[torch.tensor(keep, dtype=torch.long)].to(base_embeddings.device, base_embeddings.dtype)
+    embeddings = torch.cat([base_embeddings, rows])
+    queries = list(base_queries) + [delta.queries[i] for i in keep] if base_queries is not None else None
+
+    _atomic_save(embeddings, embeddings_path)
+    _atomic_save(commands, commands_path)
+    if queries is not None and queries_path:
+        _atomic_save(queries, queries_path)
+    if mark:
+        log.mark_compacted(delta.offsets[n - 1])
+    delta.drop_first(n)
+    return embeddings, commands, queries
+
+
+def start_compactor(interval: float, fn) -> threading.Thread:
+    """Run fn() every `interval` seconds on a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                fn()
+            except Exception as e:
+                print(f"[feedback] compaction failed: {e}")
+
+    t = threading.Thread(target=loop, name="feedback-compactor", daemon=True)
+    t.start()
+    return t
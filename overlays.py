@@ -0,0 +1,206 @@
+"""
+overlays.py
+
+Tenant overlay command packs searched together with the shared index.
+
+A pack is a small, separately built segment: the embeddings of a team's own
+(user_query, command) pairs, encoded the same way as the base index, plus the
+allowlist entries /run needs for those commands. Packs live in
+overlays/<tenant>/<pack>.pt and are loaded / unloaded at runtime without
+touching the base .pt files; memory per tenant is just the size of its packs.
+
+The tenant of a request is decided by the server, not the client: requests carry
+an X-Tenant-Token header, and only tokens issued with `overlays.py token` (kept
+in overlays/tokens.json) map to a tenant. Such a request is answered from the
+base index merged with that tenant's packs, and /run accepts the packs'
+commands. Without a known token a request sees the base index only.
+
+Usage:
+  python overlays.py build team-a deploy team_a_deploy.csv     # -> overlays/team-a/deploy.pt
+  python overlays.py token team-a                              # prints a new token for team-a
+  curl -X POST   localhost:5000/overlays/team-a/deploy          # load into the running app
+  curl -X DELETE localhost:5000/overlays/team-a/deploy          # unload
+  curl -H 'X-Tenant-Token: <token>' -d '{"query": "deploy staging"}' -H 'Content-Type: application/json' localhost:5000/suggest
+"""
+
+import argparse
+import json
+import os
+import re
+import secrets
+import threading
+from typing import Dict, List, Optional
+
+import torch
+
+from canonicalize import fill_command
+from embedding_cache import model_key
+from fast_path import Match, ParaphraseLookup
+
+
+OVERLAY_DIR = "overlays"
+TENANT_HEADER = "X-Tenant-Token"
+TOKENS_FILE = "tokens.json"        # {token: tenant}, under the overlay root
+_NAME = re.compile(r"^[\w\-]+$")   # tenant and pack names double as path components
+
+
+def pack_path(tenant: str, name: str, root: str = OVERLAY_DIR) -> str:
+    if not (_NAME.match(tenant) and _NAME.match(name)):
+        raise ValueError(f"invalid tenant or pack name: {tenant!r}/{name!r}")
+    return os.path.join(root, tenant, f"{name}.pt")
+
+
+def read_tokens(root: str = OVERLAY_DIR) -> Dict[str, str]:
+    path = os.path.join(root, TOKENS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OverlayPack:
+    def __init__(self, name: str, embeddings: torch.Tensor, commands: List[str], queries: List[str],
+                 allowed: set, model: str):
+        self.name = name
+        self.embeddings = torch.nn.functional.normalize(embeddings.float(), dim=1)
+        self.commands = commands
+        self.queries = queries
+        self.allowed = allowed
+        self.model = model
+        self.fast_path = ParaphraseLookup(queries, commands, canonical=True)
+
+    @classmethod
+    def load(cls, path: str, name: str) -> "OverlayPack":
+        data = torch.load(path)
+        return cls(name, data["embeddings"], data["commands"], data["queries"], set(data["allowed"]), data["model"])
+
+    def search(self, query: str, query_emb: torch.Tensor, k: int) -> List[dict]:
+        """Top-k suggestions from this pack, with the user's values re-injected."""
+        q = torch.nn.functional.normalize(query_emb.reshape(1, -1).to(self.embeddings.dtype), dim=1)
+        scores = (q @ self.embeddings.T)[0]
+        top = torch.topk(scores, min(k, len(self.commands)))
+        return [{"command": fill_command(self.commands[i], query, self.queries[i]), "score": s,
+                 "path": "dense", "pack": self.name}
+                for s, i in zip(top.values.tolist(), top.indices.tolist())]
+
+    def nbytes(self) -> int:
+        return self.embeddings.element_size() * self.embeddings.nelement()
+
+
+class OverlayRegistry:
+    """Loaded packs per tenant; safe to use from request threads while packs are (un)loaded."""
+
+    def __init__(self, model_name: str, root: str = OVERLAY_DIR):
+        self.model = model_key(model_name)
+        self.root = root
+        self._packs: Dict[str, Dict[str, OverlayPack]] = {}
+        self._tokens = read_tokens(root)
+        self._lock = threading.Lock()
+
+    def tenant(self, token: Optional[str]) -> Optional[str]:
+        """The tenant an X-Tenant-Token was issued to, or None for a missing or unknown token."""
+        if not token:
+            return None
+        with self._lock:
+            return self._tokens.get(token)
+
+    def load(self, tenant: str, name: str) -> OverlayPack:
+        """Load a pack; tokens issued since startup are picked up too."""
+        pack = OverlayPack.load(pack_path(tenant, name, self.root), name)
+        if pack.model != self.model:
+            raise ValueError(f"pack {tenant}/{name} was built with {pack.model}, index uses {self.model}")
+        tokens = read_tokens(self.root)
+        with self._lock:
+            self._packs.setdefault(tenant, {})[name] = pack
+            self._tokens = tokens
+        return pack
+
+    def unload(self, tenant: str, name: str) -> bool:
+        with self._lock:
+            packs = self._packs.get(tenant, {})
+            removed = packs.pop(name, None) is not None
+            if not packs:
+                self._packs.pop(tenant, None)
+            return removed
+
+    def packs(self, tenant: Optional[str]) -> List[OverlayPack]:
+        if not tenant:
+            return []
+        with self._lock:
+            return list(self._packs.get(tenant, {}).values())
+
+    def allows(self, tenant: Optional[str], command: str) -> bool:
+        return any(command in p.allowed for p in self.packs(tenant))
+
+    def lookup(self, tenant: Optional[str], query: str) -> Optional[Match]:
+        """Fast-path hit in the tenant's own packs (checked before the shared index)."""
+        for pack in self.packs(tenant):
+            hit = pack.fast_path.lookup(query)
+            if hit is not None:
+                return hit
+        return None
+
+    def search(self, tenant: Optional[str], query: str, query_emb: torch.Tensor, k: int) -> List[dict]:
+        return [s for p in self.packs(tenant) for s in p.search(query, query_emb, k)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {t: {n: {"rows": len(p.commands), "bytes": p.nbytes()} for n, p in packs.items()}
+                    for t, packs in self._packs.items()}
+
+
+def merge_suggestions(base: List[dict], overlay: List[dict], k: int) -> List[dict]:
+    """One top-k over base and overlay suggestions."""
+    return sorted(base + overlay, key=lambda s: s["score"], reverse=True)[:k]
+
+
+# ----------------------------
+# Building a pack
+# ----------------------------
+def build_pack(tenant: str, name: str, data: str, model_name: str, root: str = OVERLAY_DIR) -> str:
+    from build_index import encode_queries, load_pairs
+
+    path = pack_path(tenant, name, root)
+    queries, commands = load_pairs(data)
+    embeddings = encode_queries(model_name, queries)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save({"embeddings": embeddings, "commands": commands, "queries": queries,
+                "allowed": sorted({c.split(" : ")[0] for c in commands}), "model": model_key(model_name)}, path)
+    return path
+
+
+def issue_token(tenant: str, root: str = OVERLAY_DIR) -> str:
+    """Add a random token for `tenant` to the token file; only the server side ever writes it."""
+    pack_path(tenant, "token", root)     # validates the tenant name
+    tokens = read_tokens(root)
+    token = secrets.token_urlsafe(24)
+    tokens[token] = tenant
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, TOKENS_FILE), "w", encoding="utf-8") as f:
+        json.dump(tokens, f, indent=2)
+    return token
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tenant overlay command packs")
+    sub = parser.add_subparsers(dest="action", required=True)
+    b = sub.add_parser("build", help="Encode a (user_query, command) CSV into a pack")
+    b.add_argument("tenant")
+    b.add_argument("name")
+    b.add_argument("data", help="CSV with user_query and command columns")
+    b.add_argument("--model", default="saved_model_2", help="Must be the model the app serves")
+    b.add_argument("--root", default=OVERLAY_DIR)
+    t = sub.add_parser("token", help="Issue an X-Tenant-Token for a tenant")
+    t.add_argument("tenant")
+    t.add_argument("--root", default=OVERLAY_DIR)
+    args = parser.parse_args()
+
+    if args.action == "token":
+        print(issue_token(args.tenant, args.root))
+        return
+    path = build_pack(args.tenant, args.name, args.data, args.model, args.root)
+    print(f"[{args.tenant}/{args.name}] -> {path}")
+
+
+if __name__ == "__main__":
+    main()
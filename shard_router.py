@@ -0,0 +1,175 @@
+"""
+shard_router.py
+
+Scatter-gather front end for serving the index from several app.py nodes.
+
+Each shard is a normal app.py started with TEXT2CMD_SHARD=i/n: it loads only the
+rows of the commands that hash to partition i (all paraphrases of a command stay
+on one shard; build them with build_index.py --shards n) and answers POST /search
+with its own top-k distinct commands, scored by the same fast path / canonical
+dense search as /suggest. The fast path is checked against every paraphrase, so
+a text that is ambiguous across shards goes to dense search on all of them, and
+an unambiguous hit is answered only by the shard holding its command.
+
+The router sends each query to every shard in parallel, waits at most
+`deadline` seconds, and merges whatever arrived into a global top-k with
+duplicate commands removed. A slow or dead shard costs its partition's
+candidates for that query, never the request. /suggest answers in the same shape as
+app.py (plus an X-Shards-Answered header); /run is forwarded to a live shard
+(every shard keeps the full allowlist). The X-Tenant-Token header is passed
+through; each shard maps it to a tenant with its own overlays/tokens.json and
+merges that tenant's overlay packs (overlays.py) in.
+Shards capture no feedback from /run; new pairs go into commands.csv and a rebuild.
+
+Usage:
+  python shard_router.py --spawn 3                  # 3 local shards on ports 5001-5003, router on 5000
+  python shard_router.py --shards http://10.0.0.2:5000 http://10.0.0.3:5000 --deadline 0.3
+"""
+
+import argparse
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+
+DEFAULT_DEADLINE = 0.5   # seconds the router waits for shard answers
+DEFAULT_K = 3
+TENANT_HEADER = "X-Tenant-Token"   # same header as overlays.py; kept here so the router needs no torch
+
+
+def merge_rows(row_lists: List[List[dict]], k: int) -> List[dict]:
+    """Global top-k over several best-first row lists, keeping the best row per command."""
+    merged, seen = [], set()
+    for row in sorted((r for rows in row_lists for r in rows), key=lambda r: r["score"], reverse=True):
+        if row["command"] in seen:
+            continue
+        seen.add(row["command"])
+        merged.append(row)
+        if len(merged) == k:
+            break
+    return merged
+
+
+def _post(url: str, payload: dict, timeout: float, tenant: Optional[str] = None) -> Tuple[int, dict]:
+    headers = {"Content-Type": "application/json"}
+    if tenant:
+        headers[TENANT_HEADER] = tenant
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:    # 403 / 503 from a shard's /run are answers, not failures
+        return e.code, json.loads(e.read() or b"{}")
+
+
+class ShardRouter:
+    def __init__(self, shards: List[str], deadline: float = DEFAULT_DEADLINE):
+        self.shards = [s.rstrip("/") for s in shards]
+        self.deadline = deadline
+        self.pool = ThreadPoolExecutor(max_workers=4 * len(self.shards), thread_name_prefix="shard")
+        self._lock = threading.Lock()
+        self.counts = {s: {"answered": 0, "late": 0, "failed": 0} for s in self.shards}
+
+    def _search_one(self, shard: str, query: str, k: int, tenant: Optional[str]) -> List[dict]:
+        return _post(shard + "/search", {"query": query, "k": k}, self.deadline, tenant)[1]
+
+    def search(self, query: str, k: int = DEFAULT_K, tenant: Optional[str] = None) -> Tuple[List[dict], int]:
+        """Returns (merged top-k rows, number of shards that answered within the deadline)."""
+        futures = {self.pool.submit(self._search_one, s, query, k, tenant): s for s in self.shards}
+        done, late = wait(futures, timeout=self.deadline)
+        row_lists = []
+        with self._lock:
+            for f in done:
+                if f.exception() is None:
+                    row_lists.append(f.result())
+                    self.counts[futures[f]]["answered"] += 1
+                else:
+                    self.counts[futures[f]]["failed"] += 1
+            for f in late:
+                self.counts[futures[f]]["late"] += 1
+        return merge_rows(row_lists, k), len(row_lists)
+
+    def run(self, payload: dict, tenant: Optional[str] = None) -> Tuple[int, dict]:
+        """Forward a /run request to the first shard that accepts the connection."""
+        for shard in self.shards:
+            try:
+                return _post(shard + "/run", payload, timeout=60, tenant=tenant)
+            except (OSError, ValueError):
+                continue
+        return 503, {"error": "No shard available"}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"deadline": self.deadline, "shards": {s: dict(c) for s, c in self.counts.items()}}
+
+
+# ----------------------------
+# Local shard processes for testing on one machine
+# ----------------------------
+def spawn_shards(n: int, base_port: int) -> List[str]:
+    """Start n app.py shards on base_port+1 .. base_port+n; they are stopped when the router exits."""
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    procs, urls = [], []
+    for i in range(n):
+        port = base_port + 1 + i
+        env = dict(os.environ, TEXT2CMD_SHARD=f"{i}/{n}", PORT=str(port))
+        procs.append(subprocess.Popen([sys.executable, app_path], env=env, cwd=os.path.dirname(app_path)))
+        urls.append(f"http://127.0.0.1:{port}")
+    atexit.register(lambda: [p.terminate() for p in procs])
+    return urls
+
+
+def create_app(router: ShardRouter):
+    from flask import Flask, jsonify, render_template, request
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    CORS(app)
+
+    @app.route('/suggest', methods=['POST'])
+    def suggest():
+        query = request.json.get('query', '')
+        rows, answered = router.search(query, k=int(request.json.get('k', DEFAULT_K)),
+                                       tenant=request.headers.get(TENANT_HEADER))
+        suggestions = [{"command": r["command"], "score": r["score"], "path": r.get("path", "dense")} for r in rows]
+        return jsonify(suggestions), 200, {"X-Shards-Answered": f"{answered}/{len(router.shards)}"}
+
+    @app.route('/run', methods=['POST'])
+    def run_command():
+        status, body = router.run(request.json, tenant=request.headers.get(TENANT_HEADER))
+        return jsonify(body), status
+
+    @app.route('/metrics')
+    def metrics():
+        return jsonify({"router": router.stats()})
+
+    @app.route('/')
+    def index():
+        return render_template('terminal.html')
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scatter-gather router over sharded app.py nodes")
+    parser.add_argument("--shards", nargs="*", default=[], help="Shard base URLs")
+    parser.add_argument("--spawn", type=int, default=0, help="Start this many local app.py shards")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="Seconds to wait for shards")
+    args = parser.parse_args()
+
+    shards = args.shards + (spawn_shards(args.spawn, args.port) if args.spawn else [])
+    if not shards:
+        parser.error("give --shards URLs or --spawn N")
+    create_app(ShardRouter(shards, args.deadline)).run(port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@
 
     let suggestions = []
     let activeIndex = -1 // which suggestion is highlighted
+    let lastQuery = "" // query the current suggestions were fetched for
 
     function printLine({ text, isError = false, isCmd = false, prefix = "PS C:\\Users\\You>" }) {
         const line = document.createElement("div")
@@ -40,6 +41,7 @@
             clearSuggestions()
             return
         }
+        lastQuery = query
         setLoading(true)
         try {
             const res = await fetch("/suggest", {
@@ -58,7 +60,7 @@
         }
     }
 
-    async function runCommand(command) {
+    async function runCommand(command, query = "") {
         if (!command.trim()) return
         printLine({ text: command, isCmd: true })
 
@@ -67,7 +69,7 @@
             const res = await fetch("/run", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ command }),
+                body: JSON.stringify({ command, query }), // query is sent only for accepted suggestions
             })
             const data = await res.json()
             if (!res.ok) {
@@ -134,7 +136,7 @@
         if (activeIndex < 0 || activeIndex >= suggestions.length) return
         const cmd = suggestions[activeIndex].command || ""
         queryInput.value = cmd // surface the chosen command
-        runCommand(cmd)
+        runCommand(cmd, lastQuery)
         suggestions = []
         clearSuggestions()
         queryInput.focus()
@@ -167,8 +169,8 @@
     // Events
     suggestBtn.addEventListener("click", () => fetchSuggestions(queryInput.value))
     runBtn.addEventListener("click", () => {
-        const cmd = activeIndex >= 0 ? suggestions[activeIndex]?.command || "" : queryInput.value
-        runCommand(cmd)
+        if (activeIndex >= 0) runCommand(suggestions[activeIndex]?.command || "", lastQuery)
+        else runCommand(queryInput.value)
     })
 
     queryInput.addEventListener("keydown", (e) => {
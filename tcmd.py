@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+tcmd.py
+
+Thin shell client for daemon.py. It only imports the standard-library pieces it
+needs (no pandas/torch/sentence-transformers), sends the query over a Unix
+domain socket and prints the suggestions, so a warm daemon answers in tens of
+milliseconds.
+
+Usage:
+  python tcmd.py show hidden files with details
+  python tcmd.py -k 5 show disk usage
+  python tcmd.py --intent list all files      # intent classifier instead of semantic search
+
+The daemon is started in the background on first use if it is not running.
+"""
+
+import json
+import os
+import socket
+import sys
+
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon.py")
+START_TIMEOUT = 180   # seconds to wait for a cold daemon to load its model
+
+
+def socket_path() -> str:
+    if os.environ.get("TEXT2CMD_SOCKET"):
+        return os.environ["TEXT2CMD_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(runtime_dir, f"text2cmd-{os.getuid()}.sock")
+
+
+def request(payload: dict, path: str, timeout: float = 30.0) -> dict:
+    """Send one JSON request line and read one JSON response line."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(payload).encode() + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf)
+
+
+def start_daemon(path: str):
+    import subprocess
+    import time
+
+    print("[tcmd] starting daemon (first run loads the model)...", file=sys.stderr)
+    with open(path + ".log", "ab") as log:
+        subprocess.Popen([sys.executable, DAEMON_SCRIPT, "--socket", path],
+                         cwd=os.path.dirname(DAEMON_SCRIPT),   # artifacts are resolved relative to the repo
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         start_new_session=True)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            request({"op": "ping"}, path)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"[tcmd] daemon did not come up on {path}")
+
+
+def main(argv):
+    k, op = 3, "suggest"
+    while argv and argv[0].startswith("-"):
+        flag = argv.pop(0)
+        if flag == "-k" and argv:
+            k = int(argv.pop(0))
+        elif flag == "--intent":
+            op = "intent"
+        else:
+            print(__doc__.strip())
+            return 0 if flag in ("-h", "--help") else 2
+    query = " ".join(argv).strip()
+    if not query:
+        print(__doc__.strip())
+        return 2
+
+    path = socket_path()
+    payload = {"op": op, "query": query, "k": k}
+    try:
+        resp = request(payload, path)
+    except OSError:
+        start_daemon(path)
+        resp = request(payload, path)
+
+    if "error" in resp:
+        print(f"error: {resp['error']}", file=sys.stderr)
+        return 1
+    if op == "intent":
+        print(f"{resp['command']}   (base={resp['predicted_base']}, conf={resp['confidence']:.2f})")
+    else:
+        for i, s in enumerate(resp["suggestions"], start=1):
+            print(f"[{i}] {s['command']}   (score={s['score']:.3f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
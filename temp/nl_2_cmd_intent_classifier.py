@@ -7,8 +7,15 @@ with lightweight argument/flag extraction.
 
 Usage:
   - Train and evaluate: python nl2cmd_intent_classifier.py --train
+  - Streaming training on the full paraphrase corpus (bounded memory):
+      python nl2cmd_intent_classifier.py --train-stream [--data commands.csv] [--epochs 3] [--compare]
+  - Pick the model explicitly (default: whichever was trained last):
+      python nl2cmd_intent_classifier.py --predict "list all files" --model stream
+  - Benchmark predictions/sec: python nl2cmd_intent_classifier.py --benchmark
   - Predict single query: python nl2cmd_intent_classifier.py --predict "list all files"
   - Interactive mode: python nl2cmd_intent_classifier.py --interactive
+  - Repeated shell use: python tcmd.py --intent "list all files"
+    (served by the long-lived daemon.py, so the model is loaded only once)
 
 Note: This script only *suggests* commands. It DOES NOT execute anything.
 Use it as a starting point and improve dataset, feature extraction, and safety checks.
@@ -16,20 +23,31 @@ Use it as a starting point and improve dataset, feature extraction, and safety c
 
 import re
 import os
+import sys
+import time
+import zlib
 import argparse
-from typing import Optional, Tuple, List
+from typing import Iterator, Optional, Tuple, List
 
+import numpy as np
 import pandas as pd
+from scipy.special import expit
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
 import joblib
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from entities import Entity, default_lexer
+
 
 MODEL_DIR = "models"
 VECT_FILE = os.path.join(MODEL_DIR, "vectorizer.joblib")
 MODEL_FILE = os.path.join(MODEL_DIR, "intent_model.joblib")
+STREAM_MODEL_FILE = os.path.join(MODEL_DIR, "intent_stream.npz")
+CORPUS_FILE = "commands.csv"
+SHUFFLE_ROWS = 65536      # rows mixed across chunks while streaming (the corpus is grouped by command)
 
 
 def make_sample_dataset() -> pd.DataFrame:
@@ -113,70 +131,218 @@ def train_and_save(df: pd.DataFrame, vectorizer_path: str = VECT_FILE, model_pat
     print(f"Saved vectorizer -> {vectorizer_path}\nSaved model -> {model_path}")
 
 
+# ---------- Streaming training (full paraphrase corpus) ----------
+
+def base_command(command: str) -> str:
+    """Label for a full command line: its executable, ignoring a leading sudo."""
+    tokens = [t for t in command.split() if t != 'sudo']
+    return tokens[0] if tokens else command.strip()
+
+
+def _read_chunks(path: str, chunksize: int) -> Iterator[Tuple[List[str], List[str]]]:
+    cols = set(pd.read_csv(path, nrows=0).columns)
+    if {'query', 'label'} <= cols:
+        qcol, lcol, to_label = 'query', 'label', str
+    else:
+        qcol, lcol, to_label = 'user_query', 'command', base_command
+    for chunk in pd.read_csv(path, usecols=[qcol, lcol], chunksize=chunksize):
+        chunk = chunk.dropna()
+        yield (chunk[qcol].astype(str).map(preprocess).tolist(),
+               chunk[lcol].astype(str).map(to_label).tolist())
+
+
+def iter_corpus(path: str, chunksize: int = 4096, seed: int = 42,
+                shuffle_rows: int = 0) -> Iterator[Tuple[List[str], List[str]]]:
+    """
+    Yield (preprocessed queries, labels) chunks without loading the whole file.
+    Accepts either query,label columns or the user_query,command paraphrase corpus.
+    With shuffle_rows, chunks are drawn at random from a buffer of that many rows
+    that spans file chunks, so a chunk mixes many commands even though the corpus
+    is grouped by command; memory stays bounded by the buffer.
+    """
+    if not shuffle_rows:
+        yield from _read_chunks(path, chunksize)
+        return
+    rng = np.random.default_rng(seed)
+    buf: List[Tuple[str, str]] = []
+
+    def draw(n):
+        nonlocal buf
+        pick = np.zeros(len(buf), dtype=bool)
+        pick[rng.choice(len(buf), size=n, replace=False)] = True
+        rows = [r for r, p in zip(buf, pick) if p]
+        buf = [r for r, p in zip(buf, pick) if not p]
+        rows = [rows[i] for i in rng.permutation(len(rows))]
+        return [q for q, _ in rows], [l for _, l in rows]
+
+    for queries, labels in _read_chunks(path, chunksize):
+        buf.extend(zip(queries, labels))
+        while len(buf) >= shuffle_rows + chunksize:
+            yield draw(chunksize)
+    while buf:
+        yield draw(min(chunksize, len(buf)))
+
+
+def is_holdout(text: str, holdout_pct: int) -> bool:
+    # Deterministic split that needs no second copy of the data
+    return zlib.crc32(text.encode('utf-8')) % 100 < holdout_pct
+
+
+def make_hashing_vectorizer(n_features: int) -> HashingVectorizer:
+    return HashingVectorizer(ngram_range=(1, 2), n_features=n_features, alternate_sign=False, norm='l2')
+
+
+class CompactIntentModel:
+    """
+    One-vs-rest linear model stored only for the hashed features seen in training.
+    Mirrors SGDClassifier(loss='log_loss').predict_proba, but the artifact is a
+    small .npz (float16 weights) that loads without unpickling.
+    """
+
+    def __init__(self, classes: np.ndarray, columns: np.ndarray, coef: np.ndarray,
+                 intercept: np.ndarray, n_features: int):
+        self.classes_ = classes
+        self.columns = columns
+        self.coef = coef.astype(np.float32)
+        self.intercept = intercept.astype(np.float32)
+        self.n_features = int(n_features)
+
+    @classmethod
+    def from_sgd(cls, clf: SGDClassifier, n_features: int) -> 'CompactIntentModel':
+        columns = np.flatnonzero(np.any(clf.coef_ != 0, axis=0)).astype(np.int32)
+        return cls(clf.classes_, columns, clf.coef_[:, columns], clf.intercept_, n_features)
+
+    def predict_proba(self, X) -> np.ndarray:
+        scores = np.asarray(X[:, self.columns] @ self.coef.T) + self.intercept
+        prob = expit(scores)
+        if prob.shape[1] == 1:   # two classes: a single decision function, for classes_[1]
+            return np.hstack([1 - prob, prob])
+        prob /= prob.sum(axis=1, keepdims=True)
+        return prob
+
+    def save(self, path: str):
+        np.savez(path, classes=self.classes_.astype(str), columns=self.columns,
+                 coef=self.coef.astype(np.float16), intercept=self.intercept,
+                 n_features=np.int64(self.n_features))
+
+    @classmethod
+    def load(cls, path: str) -> 'CompactIntentModel':
+        z = np.load(path, allow_pickle=False)
+        return cls(z['classes'], z['columns'], z['coef'], z['intercept'], int(z['n_features']))
+
+
+def tfidf_holdout_accuracy(path: str, holdout_pct: int) -> float:
+    """Accuracy of the in-memory TF-IDF model of train_and_save on the streaming hold-out split."""
+    queries, labels = [], []
+    for qs, ls in iter_corpus(path):
+        queries += qs
+        labels += ls
+    test = [is_holdout(q, holdout_pct) for q in queries]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), max_features=5000)
+    X_train = vectorizer.fit_transform([q for q, t in zip(queries, test) if not t])
+    clf = LogisticRegression(max_iter=1000, class_weight='balanced', solver='liblinear')
+    clf.fit(X_train, [l for l, t in zip(labels, test) if not t])
+    pred = clf.predict(vectorizer.transform([q for q, t in zip(queries, test) if t]))
+    return accuracy_score([l for l, t in zip(labels, test) if t], pred)
+
+
+def train_streaming(path: str = CORPUS_FILE, epochs: int = 3, chunksize: int = 4096,
+                    n_features: int = 2 ** 18, holdout_pct: int = 10, model_path: str = STREAM_MODEL_FILE,
+                    compare: bool = False):
+    # The label set must be known before the first partial_fit; one cheap pass over labels only
+    classes = set()
+    for _, labels in iter_corpus(path, chunksize):
+        classes.update(labels)
+    classes = np.array(sorted(classes))
+
+    vect = make_hashing_vectorizer(n_features)
+    clf = SGDClassifier(loss='log_loss', alpha=1e-6, random_state=42)
+    for epoch in range(epochs):
+        seen = 0
+        for queries, labels in iter_corpus(path, chunksize, seed=epoch, shuffle_rows=SHUFFLE_ROWS):
+            train = [(q, l) for q, l in zip(queries, labels) if not is_holdout(q, holdout_pct)]
+            if not train:
+                continue
+            X = vect.transform([q for q, _ in train])
+            clf.partial_fit(X, [l for _, l in train], classes=classes)
+            seen += len(train)
+        print(f"epoch {epoch + 1}/{epochs}: {seen} training rows")
+
+    model = CompactIntentModel.from_sgd(clf, n_features)
+
+    correct = total = 0
+    for queries, labels in iter_corpus(path, chunksize):
+        test = [(q, l) for q, l in zip(queries, labels) if is_holdout(q, holdout_pct)]
+        if not test:
+            continue
+        prob = model.predict_proba(vect.transform([q for q, _ in test]))
+        pred = model.classes_[prob.argmax(axis=1)]
+        correct += int(np.sum(pred == np.array([l for _, l in test])))
+        total += len(test)
+
+    print("\n=== Evaluation (streamed hold-out) ===")
+    print(f"Classes: {len(classes)}  Hold-out rows: {total}  Accuracy: {correct / max(total, 1):.4f}")
+    if compare:
+        print(f"TF-IDF + LogisticRegression on the same split: {tfidf_holdout_accuracy(path, holdout_pct):.4f}")
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    model.save(model_path)
+    print(f"Saved compact model -> {model_path} ({os.path.getsize(model_path) / 1e6:.1f} MB, "
+          f"{len(model.columns)} active features)")
+
+
 # ---------- Argument / flag extraction helpers ----------
+# All three helpers read the typed tokens from one pass of the shared lexer
+# (entities.py); per-command flag cues live in flag_rules.json.
 
-def extract_quoted(text: str) -> Optional[str]:
-    m = re.search(r'"(.+?)"|\'(.+?)\'', text)
-    if m:
-        return m.group(1) or m.group(2)
-    return None
+PREPOSITIONS = {'in', 'into', 'inside', 'to', 'under', 'within'}
+ARG_STOP_WORDS = {'recursively', 'with', 'and', 'for', 'where'}
+ARG_KINDS = ('word', 'path', 'filename', 'number')
 
 
-def extract_path_or_name(text: str) -> Optional[str]:
+def _quoted(tokens: List[Entity]) -> Optional[str]:
+    return next((t.value for t in tokens if t.kind == 'quoted'), None)
+
+
+def _path_or_name(tokens: List[Entity], text: str) -> Optional[str]:
+    seq = [t for t in tokens if t.kind != 'flag_phrase']
     # look for patterns like: in <name>, to <name>, into <name>
-    m = re.search(r'\b(?:in|into|inside|to|under|within)\s+([A-Za-z0-9_\-./\\ ]+)', text)
-    if m:
-        path = m.group(1).strip()
-        # cut off common trailing words
-        path = re.split(r'\b(recursively|with|and|for|where)\b', path)[0].strip()
-        return path
-    # fallback: maybe last token is a filename
-    tokens = text.strip().split()
-    if tokens:
-        last = tokens[-1]
-        # treat tokens with a dot or starting with / as filename/path
-        if '.' in last or last.startswith('/'):
-            return last
+    for i, t in enumerate(seq):
+        if t.kind != 'word' or t.value.lower() not in PREPOSITIONS:
+            continue
+        run = []
+        for u in seq[i + 1:]:
+            if u.kind not in ARG_KINDS or u.value.lower() in ARG_STOP_WORDS:
+                break
+            if run and text[run[-1].end:u.start].strip():
+                break  # punctuation between tokens ends the argument
+            run.append(u)
+        if run:
+            return text[run[0].start:run[-1].end]
+    # fallback: maybe last token is a filename or path
+    if seq and seq[-1].kind in ('filename', 'path'):
+        return seq[-1].value
     return None
 
 
+def extract_quoted(text: str) -> Optional[str]:
+    return _quoted(default_lexer().entities(text, ('quoted',)))
+
+
+def extract_path_or_name(text: str) -> Optional[str]:
+    return _path_or_name(default_lexer().analyze(text, with_words=True)[0], text)
+
+
 def extract_flags(text: str, base_cmd: str) -> str:
-    flags = []
-    t = text.lower()
-    # generic patterns
-    if base_cmd == 'ls':
-        if re.search(r'\b(hidden|all hidden|hidden files|show hidden|show all)\b', t):
-            flags.append('-a')
-        if re.search(r'\b(long|details|detailed|with details|list with details|verbose)\b', t):
-            flags.append('-l')
-        if 'human readable' in t or 'human-readable' in t:
-            flags.append('-h')
-        if 'recursive' in t:
-            flags.append('-R')
-    elif base_cmd == 'rm':
-        if 'recursive' in t:
-            flags.append('-r')
-        if 'force' in t or 'without prompt' in t:
-            flags.append('-f')
-    elif base_cmd in ('cp', 'mv'):
-        if 'recursive' in t:
-            flags.append('-r')
-    elif base_cmd == 'grep':
-        if 'ignore case' in t or 'case insensitive' in t:
-            flags.append('-i')
-        if 'recursive' in t:
-            flags.append('-r')
-    # add more mappings as you expand commands
-    return ' '.join(flags).strip()
+    return ' '.join(default_lexer().flags_for(text, base_cmd))
 
 
 def compose_command(base_cmd: str, text: str) -> Tuple[str, dict]:
     """Return (command_string, metadata) without executing it."""
+    tokens, flag_list = default_lexer().analyze(text, base_cmd, with_words=True)
     # try quoted first
-    quoted = extract_quoted(text)
-    path_or_name = extract_path_or_name(text)
-    arg = quoted or path_or_name
-    flags = extract_flags(text, base_cmd)
+    arg = _quoted(tokens) or _path_or_name(tokens, text)
+    flags = ' '.join(flag_list)
 
     parts = [base_cmd]
     if flags:
@@ -191,24 +357,61 @@ def compose_command(base_cmd: str, text: str) -> Tuple[str, dict]:
 
 # ---------- Prediction API ----------
 
-def load_model(vectorizer_path: str = VECT_FILE, model_path: str = MODEL_FILE):
-    if not os.path.exists(vectorizer_path) or not os.path.exists(model_path):
+def load_model(vectorizer_path: str = VECT_FILE, model_path: str = MODEL_FILE,
+               stream_path: str = STREAM_MODEL_FILE, kind: Optional[str] = None):
+    """
+    Load the 'stream' (compact, --train-stream) or 'tfidf' (--train) model.
+    With no kind, whichever of the two was trained last.
+    """
+    has_tfidf = os.path.exists(vectorizer_path) and os.path.exists(model_path)
+    if kind is None:
+        kind = 'tfidf' if has_tfidf else 'stream'
+        if has_tfidf and os.path.exists(stream_path) and os.path.getmtime(stream_path) > os.path.getmtime(model_path):
+            kind = 'stream'
+    if kind == 'stream':
+        if not os.path.exists(stream_path):
+            raise FileNotFoundError(f"{stream_path} not found. Run with --train-stream first.")
+        clf = CompactIntentModel.load(stream_path)
+        return make_hashing_vectorizer(clf.n_features), clf
+    if not has_tfidf:
         raise FileNotFoundError("Model or vectorizer not found. Run with --train first or provide models.")
     vect = joblib.load(vectorizer_path)
     clf = joblib.load(model_path)
     return vect, clf
 
 
+def predict_batch(texts: List[str], vect, clf) -> List[dict]:
+    """Label and confidence for many queries from a single predict_proba pass."""
+    X = vect.transform([preprocess(t) for t in texts])
+    prob = clf.predict_proba(X)
+    best = prob.argmax(axis=1)
+    labels = clf.classes_[best]
+    confs = prob[np.arange(len(texts)), best]
+    out = []
+    for text, label, conf in zip(texts, labels, confs):
+        cmd, meta = compose_command(str(label), text)
+        out.append({'query': text, 'predicted_base': str(label), 'command': cmd,
+                    'confidence': float(conf), 'meta': meta})
+    return out
+
+
 def predict_query(text: str, vect, clf) -> dict:
-    t = preprocess(text)
-    X = vect.transform([t])
-    prob = clf.predict_proba(X)[0]
-    label = clf.predict(X)[0]
-    # get confidence for predicted class
-    classes = clf.classes_
-    conf = float(prob[list(classes).index(label)])
-    cmd, meta = compose_command(label, text)
-    return {'query': text, 'predicted_base': label, 'command': cmd, 'confidence': conf, 'meta': meta}
+    return predict_batch([text], vect, clf)[0]
+
+
+def benchmark(vect, clf, queries: List[str], batch_size: int = 1024):
+    """Print predictions/sec for one-at-a-time vs. batched inference."""
+    t0 = time.perf_counter()
+    for q in queries:
+        predict_query(q, vect, clf)
+    single = len(queries) / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        predict_batch(queries[i:i + batch_size], vect, clf)
+    batched = len(queries) / (time.perf_counter() - t0)
+
+    print(f"{len(queries)} queries: single {single:,.0f} pred/s, batch({batch_size}) {batched:,.0f} pred/s")
 
 
 # ---------- CLI ----------
@@ -219,8 +422,30 @@ def main():
     parser.add_argument('--data', type=str, help='Path to CSV dataset with columns query,label (optional)')
     parser.add_argument('--predict', type=str, help='Predict single query (do not execute)')
     parser.add_argument('--interactive', action='store_true', help='Interactive REPL predict mode')
+    parser.add_argument('--train-stream', action='store_true',
+                        help='Stream-train a hashing + SGD model on the paraphrase corpus (--data, default commands.csv)')
+    parser.add_argument('--epochs', type=int, default=3, help='Passes over the corpus for --train-stream')
+    parser.add_argument('--chunksize', type=int, default=4096, help='Rows per partial_fit chunk')
+    parser.add_argument('--compare', action='store_true',
+                        help='With --train-stream, also report the TF-IDF model\'s accuracy on the same hold-out')
+    parser.add_argument('--benchmark', action='store_true', help='Measure predictions/sec on corpus queries')
+    parser.add_argument('--model', choices=['tfidf', 'stream'],
+                        help='Model to load for prediction (default: the most recently trained)')
     args = parser.parse_args()
 
+    if args.train_stream:
+        train_streaming(args.data or CORPUS_FILE, epochs=args.epochs, chunksize=args.chunksize,
+                        compare=args.compare)
+        return
+
+    if args.benchmark:
+        t0 = time.perf_counter()
+        vect, clf = load_model(kind=args.model)
+        print(f"Model load: {(time.perf_counter() - t0) * 1000:.1f} ms")
+        queries = [q for qs, _ in iter_corpus(args.data or CORPUS_FILE) for q in qs]
+        benchmark(vect, clf, queries)
+        return
+
     if args.train:
         if args.data:
             df = pd.read_csv(args.data)
@@ -232,7 +457,7 @@ def main():
         return
 
     if args.predict:
-        vect, clf = load_model()
+        vect, clf = load_model(kind=args.model)
         out = predict_query(args.predict, vect, clf)
         print('\nPredicted base command:', out['predicted_base'])
         print('Confidence:', out['confidence'])
@@ -241,7 +466,7 @@ def main():
         return
 
     if args.interactive:
-        vect, clf = load_model()
+        vect, clf = load_model(kind=args.model)
         print("Interactive mode — type 'quit' or Ctrl-C to exit")
         try:
             while True:
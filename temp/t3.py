@@ -3,6 +3,7 @@ import numpy as np
 import re
 import subprocess
 import sys
+import os
 
 try:
     import pyperclip
@@ -12,15 +13,19 @@ except ImportError:
 
 from sentence_transformers import SentenceTransformer
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from embedding_cache import cached_encode
+
 # --- Load dataset ---
 df = pd.read_csv('c.csv')
 df = df[['command', 'category', 'description']]
 
 # --- Load embedding model ---
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+model = SentenceTransformer(MODEL_NAME)
 
 # --- Precompute description embeddings ---
-desc_embeddings = model.encode(df['description'], convert_to_numpy=True)
+desc_embeddings = cached_encode(model, df['description'], MODEL_NAME)  # cache read after the first run
 
 # --- Helper to fill placeholders ---
 def fill_placeholders(command, description, user_query):
@@ -0,0 +1,33 @@
+import csv
+import os
+
+from canonicalize import canonicalize, fill_command, fill_placeholders, reinject
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "commands.csv")
+
+
+def load_pairs():
+    with open(DATA, newline="", encoding="utf-8") as f:
+        rows = [(r["user_query"].strip(), r["command"].strip()) for r in csv.DictReader(f)]
+    return [q for q, c in rows if q and c], [c for q, c in rows if q and c]
+
+
+def test_filename_token_keeps_the_extension():
+    assert canonicalize("copy notes.txt to /backup").text == "copy <file.txt> to <path>"
+    assert canonicalize("extract backup.tar.gz").text == "extract <file.gz>"
+
+
+def test_reinject_swaps_values_by_kind_and_position():
+    assert reinject("cp file.txt /tmp", "copy file.txt to /tmp", "copy notes.txt to /backup") == "cp notes.txt /backup"
+    assert reinject("htop -d 5", "refresh htop every 0.5 seconds", "refresh htop every 2 seconds") == "htop -d 5"
+
+
+def test_a_verbatim_dataset_paraphrase_gets_its_command_back():
+    queries, commands = load_pairs()
+    broken = [(q, c) for q, c in zip(queries, commands) if fill_command(c, q, q) != c]
+    assert broken == []
+
+
+def test_placeholders_are_replaced_as_whole_tokens():
+    assert fill_placeholders("zstdcat file.txt.zst && cat file.txt", "show notes.md") == "zstdcat file.txt.zst && cat notes.md"
+    assert fill_command("less -i logfile.txt", "search in app.log") == "less -i logfile.txt"
@@ -0,0 +1,24 @@
+from entities import entities
+
+
+def test_contractions_are_not_quoted_strings():
+    query = "What's the way I'd list files in /tmp"
+    assert entities(query) == [("path", "/tmp", 33, 37)]
+
+
+def test_contractions_around_entities_keep_the_text_intact():
+    query = "What's the command to move `file.txt` into `/tmp`, ensuring it won't replace anything?"
+    assert [(e.kind, e.value) for e in entities(query)] == [("filename", "file.txt"), ("path", "/tmp")]
+
+
+def test_free_standing_quotes_are_still_quoted():
+    assert [(e.kind, e.value) for e in entities("grep 'error' in app.log")] == [("quoted", "error"),
+                                                                                ("filename", "app.log")]
+    assert [(e.kind, e.value) for e in entities('search "two words" here')] == [("quoted", "two words")]
+
+
+def test_abbreviations_versions_and_tool_names_are_not_filenames():
+    for query in ("use grep, e.g. for logs", "the log, i.e. syslog", "install node.js now", "upgrade to version 2.x"):
+        assert entities(query, ("filename",)) == [], query
+    found = entities("compile x.c and gzip *.log into v1.2.tar.gz", ("filename",))
+    assert [e.value for e in found] == ["x.c", "*.log", "v1.2.tar.gz"]
@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import executor
+from executor import ExecutorPool, QueueFull, _Job, run_job
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="process groups and rlimits are POSIX only")
+
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"   # a zombie has already exited
+    except FileNotFoundError:
+        return False
+
+
+def argv_of(monkeypatch, command):
+    seen = []
+
+    def fake_popen(argv, **kwargs):
+        seen.append(argv)
+        raise OSError("not started")
+
+    monkeypatch.setattr(executor.subprocess, "Popen", fake_popen)
+    run_job(command, 1, executor.DEFAULT_LIMITS)
+    return seen[0]
+
+
+def test_plain_commands_exec_argv_and_shell_syntax_goes_through_sh(monkeypatch):
+    assert argv_of(monkeypatch, "ls -la /tmp") == ["ls", "-la", "/tmp"]
+    for command in ["ls | wc -l", "echo $HOME", "ls *.txt", "cat 'a b'", "FOO=1 env", "sleep 1; ls"]:
+        assert argv_of(monkeypatch, command) == ["/bin/sh", "-c", command]
+
+
+@posix_only
+def test_shell_syntax_is_interpreted_and_argv_is_not():
+    assert run_job("echo a; echo b", 5, executor.DEFAULT_LIMITS)["stdout"] == "a\nb\n"
+    assert run_job("echo a\\;", 5, executor.DEFAULT_LIMITS)["stdout"] == "a;\n"   # `\` forces sh, which unescapes
+
+
+@posix_only
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    result = run_job(f"sleep 30 & echo $! > {pid_file}; wait", 0.5, executor.DEFAULT_LIMITS)
+    assert result == {"error": "Command timed out after 0.5s"}
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(pid)          # the backgrounded child died with its shell
+
+
+@posix_only
+def test_output_is_truncated(monkeypatch):
+    monkeypatch.setattr(executor, "MAX_OUTPUT", 10)
+    result = run_job("seq 100", 5, executor.DEFAULT_LIMITS)
+    assert result["stdout"] == "1\n2\n3\n4\n5\n\n[output truncated]"
+    assert result["stderr"] == "" and result["returncode"] == 0
+
+
+@posix_only
+def test_rlimits_are_applied():
+    limits = {"cpu_seconds": 3, "memory_bytes": 256 * 1024 * 1024, "file_bytes": 1024 * 1024}
+    probe = ("import os, resource as r; print(r.getrlimit(r.RLIMIT_CPU), r.getrlimit(r.RLIMIT_AS), "
+             "r.getrlimit(r.RLIMIT_FSIZE), os.getpgrp() == os.getsid(0))")
+    result = run_job(f'{sys.executable} -c "{probe}"', 5, limits)
+    assert result["stdout"].split(") ") == ["(3, 4", "(268435456, 268435456", "(1048576, 1048576", "True\n"]
+
+    result = run_job(f"{sys.executable} -c \"open('big', 'wb').write(b'x' * 2 * 1024 * 1024)\"", 5, limits)
+    assert result["returncode"] != 0                       # RLIMIT_FSIZE stops the write
+
+
+def test_full_queue_raises_queue_full():
+    pool = ExecutorPool(workers=0, max_queue=1, timeout=1)
+    pool.jobs.put_nowait(_Job("true"))
+    with pytest.raises(QueueFull):
+        pool.submit("ls")
+    assert pool.metrics()["rejected"] == 1
+
+
+def test_job_no_worker_takes_is_dropped_instead_of_waiting_forever(monkeypatch):
+    monkeypatch.setattr(executor, "RESULT_GRACE", 0.1)
+    pool = ExecutorPool(workers=0, max_queue=1, timeout=0.1)
+    assert "error" in pool.submit("ls")
+    assert pool.jobs.get_nowait().cancelled and pool.metrics()["timed_out"] == 1
+
+
+def test_wedged_worker_returns_an_error_and_is_replaced(monkeypatch):
+    monkeypatch.setattr(executor, "RESULT_GRACE", 0.2)
+    spawned = []
+    real_spawn = ExecutorPool._spawn
+
+    def spawn():
+        if spawned:
+            proc = real_spawn()
+        else:   # the first worker never answers
+            proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"],
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        spawned.append(proc)
+        return proc
+
+    monkeypatch.setattr(ExecutorPool, "_spawn", staticmethod(spawn))
+    pool = ExecutorPool(workers=1, max_queue=2, timeout=1)
+    started = time.monotonic()
+    assert pool.submit("echo hi") == {"error": "executor worker did not answer within 1.2s"}
+    assert time.monotonic() - started < 5
+    assert spawned[0].wait(timeout=5) is not None and pool.metrics()["timed_out"] == 1
+    assert pool.submit("echo hi")["stdout"] == "hi\n"
+    for proc in spawned:
+        proc.kill()
@@ -0,0 +1,54 @@
+import csv
+import os
+
+from fast_path import ParaphraseLookup
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "commands.csv")
+
+
+def lookup(pairs, query, canonical=True):
+    return ParaphraseLookup([q for q, _ in pairs], [c for _, c in pairs], canonical).lookup(query)
+
+
+def test_typo_inside_a_flag_is_not_forgiven():
+    pairs = [("Run `vmstat -SM`", "vmstat -SM"), ("Execute `ipcs -m`", "ipcs -m")]
+    assert lookup(pairs, "Run `vmstat -s`") is None
+    assert lookup(pairs, "Execute `ipcs -q`") is None
+    assert lookup(pairs, "Run `vmstat -sm`") is None          # case is part of a flag
+
+
+def test_typo_inside_a_backticked_command_is_not_forgiven():
+    assert lookup([("Please run `htop` for me", "htop")], "Please run `atop` for me") is None
+
+
+def test_typo_in_the_prose_is_still_forgiven():
+    hit = lookup([("Run `vmstat -SM` please", "vmstat -SM")], "Rnu `vmstat -SM` please")
+    assert hit is not None and hit.command == "vmstat -SM" and hit.kind == "fuzzy"
+
+
+def test_runner_up_command_within_one_edit_of_the_best_rejects_the_match():
+    pairs = [("show the disk usage summary", "du -sh"), ("show the disk usage summery", "df -h")]
+    assert lookup(pairs, "show the disk usage sumary") is None
+    # the same runner-up, but for the same command, is fine
+    pairs = [("show the disk usage summary", "du -sh"), ("show the disk usage summery", "du -sh")]
+    assert lookup(pairs, "show the disk usage sumary").command == "du -sh"
+
+
+def test_stored_value_missing_from_the_command_must_be_repeated():
+    pairs = [("refresh htop every 0.5 seconds", "htop -d 5")]
+    assert lookup(pairs, "refresh htop every 2 seconds") is None
+    assert lookup(pairs, "refresh htop every 0.5 seconds").command == "htop -d 5"
+
+
+def test_filename_extension_is_part_of_the_match():
+    pairs = [("Show me the contents of `file.txt.lz`", "lzcat file.txt.lz")]
+    assert lookup(pairs, "Show me the contents of `file.txt.zst`") is None
+    assert lookup(pairs, "Show me the contents of `notes.lz`").query == "Show me the contents of `file.txt.lz`"
+
+
+def test_rival_outside_the_hit_candidates_is_still_found():
+    # the xzcat row is within best+1 edits but shares none of the query's rarest trigrams
+    with open(DATA, newline="", encoding="utf-8") as f:
+        pairs = [(r["user_query"], r["command"]) for r in csv.DictReader(f) if r["user_query"] and r["command"]]
+    assert lookup(pairs, "Disptay `file.txt.xz`") is None
+    assert lookup(pairs, "Dispoay `file.txt.lz`") is None
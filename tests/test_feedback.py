@@ -0,0 +1,46 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from feedback import DeltaSegment, FeedbackLog, compact  # noqa: E402
+
+
+def test_pending_skips_compacted_entries_and_a_torn_last_line(tmp_path):
+    log = FeedbackLog(str(tmp_path / "feedback.jsonl"))
+    first = log.append("list files", "ls")
+    second = log.append("show disk usage", "df -h")
+    with open(log.path, "a", encoding="utf-8") as f:
+        f.write('{"query": "half a li')          # crash mid-write
+    assert log.pending() == [("list files", "ls", first), ("show disk usage", "df -h", second)]
+
+    log.mark_compacted(first)
+    assert log.compacted_offset() == first
+    assert log.pending() == [("show disk usage", "df -h", second)]
+    assert len(log.entries()) == 2
+
+
+def test_drop_first_forgets_the_oldest_rows():
+    delta = DeltaSegment()
+    for i, cmd in enumerate(["ls", "pwd", "df -h"]):
+        delta.add(f"q{i}", cmd, torch.full((4,), float(i + 1)), offset=10 * (i + 1))
+    delta.drop_first(2)
+    m, commands = delta.snapshot()
+    assert commands == ["df -h"] and delta.queries == ["q2"] and delta.offsets == [30]
+    assert m.shape == (1, 4) and m[0, 0].item() == 3.0
+
+
+def test_compact_appends_new_pairs_once_and_marks_the_last_offset(tmp_path):
+    log = FeedbackLog(str(tmp_path / "feedback.jsonl"))
+    delta = DeltaSegment()
+    for q, c in [("list files", "ls"), ("where am i", "pwd"), ("where am i", "pwd")]:
+        delta.add(q, c, torch.ones(4), log.append(q, c))
+    paths = [str(tmp_path / name) for name in ("emb.pt", "cmds.pt", "queries.pt")]
+
+    out = compact(torch.zeros(1, 4), ["ls"], delta, log, paths[0], paths[1], ["list files"], paths[2])
+    embeddings, commands, queries = out
+    assert commands == ["ls", "pwd"] and queries == ["list files", "where am i"]   # no copy of a base row
+    assert embeddings.shape == (2, 4)
+    assert torch.load(paths[1]) == commands
+    assert len(delta) == 0
+    assert log.compacted_offset() == log.entries()[-1][2] and log.pending() == []
+    assert compact(embeddings, commands, delta, log, paths[0], paths[1], queries, paths[2]) is None